@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 
-import md5, os, re, tempfile, urllib
+import argparse, json, os, re, sys
+
+import fetch_cache
+
+from subtag_registry import SubtagRegistry
 
 # TODO: What to do with bcp47 extlang?
 # TODO: Verify that all Syriac languages are included, seems to be goofy
@@ -226,15 +230,7 @@ REVERSE_SPECIAL = {
 
 
 def read_url(url):
-    path = os.path.join(tempfile.gettempdir(),
-                        md5.md5(url).hexdigest())
-    if not os.path.exists(path):
-        stream = urllib.urlopen(url)
-        with open(path, 'w') as outfile:
-            outfile.write(stream.read())
-        stream.close()
-    with open(path, 'r') as cachefile:
-        return cachefile.read()
+    return fetch_cache.fetch(url)
 
 
 def read_opentype():
@@ -259,37 +255,141 @@ def read_opentype():
     return result
 
 
-def read_harfbuzz():
-    result = {}
-    hb = open('hb-ot-tag.cc', 'r').read()
-    hb = hb.split('static const LangTag ot_languages')[1]
-    hb = hb.split('};')[0]
-    for line in hb.splitlines():
-        line = line.strip()
-        if line.startswith('/*'): continue
-        # {"zum",       HB_TAG('L','R','C',' ')},       /* Kumzari */
-        match = re.search(
-            r'''{"([a-zA-Z0-9]+)",\s+HB_TAG\('(.)','(.)','(.)','(.)'\)},\s*/\*\s*(.+)\s*\*/''', line)
-        if not match: continue
-        bcp47, t1, t2, t3, t4, comment = match.groups()
-        langsys = ''.join((t1, t2, t3, t4))
-        result[bcp47] = langsys
-    return result
+HARFBUZZ_TABLE_RE = re.compile(
+    r'static const \w+ (ot_languages\w*)\[\] = \{(.*?)\n\};', re.S)
+
+# {"zum",	HB_TAG('L','R','C',' ')},	/* Kumzari */
+# Entries that are commented out do not match.
+HARFBUZZ_ENTRY_RE = re.compile(
+    r'''^\s*\{"([^"]+)",\s*HB_TAG\('(.)','(.)','(.)','(.)'\)\}''', re.M)
+
+# What hb_ot_tag_to_language() returns for tags not in ot_languages.
+HARFBUZZ_REVERSE_SPECIAL = {
+    'ZHH ': 'zh-hk',
+    'ZHS ': 'zh-Hans',
+    'ZHT ': 'zh-Hant',
+    'APPH': 'und-fonnapa',
+    'IPPH': 'und-fonipa',
+}
+
+
+class HarfBuzzTags:
+    """The language tables of HarfBuzz's hb-ot-tag.cc, parsed once.
+
+    languages: {language subtag: [langsys]} from ot_languages
+    chinese: [(tag, langsys)] from ot_languages_zh, in lookup order
+    reverse: {langsys: [bcp47]} from ot_languages, in file order
+    """
+
+    def __init__(self, path='hb-ot-tag.cc'):
+        self.languages, self.chinese, self.reverse = {}, [], {}
+        source = open(path, 'r').read()
+        for table, body in HARFBUZZ_TABLE_RE.findall(source):
+            for match in HARFBUZZ_ENTRY_RE.finditer(body):
+                bcp47, langsys = match.group(1), ''.join(match.groups()[1:])
+                if table == 'ot_languages_zh':
+                    self.chinese.append((bcp47, langsys))
+                else:
+                    self.languages.setdefault(bcp47, []).append(langsys)
+                    self.reverse.setdefault(langsys, []).append(bcp47)
+
+    def from_language(self, tag, guess=True):
+        """Like hb_ot_tag_from_language(), but None instead of 'dflt'.
+
+        Without guess, three-letter languages that are not in the tables
+        give None, rather than their upper-cased code.
+        """
+        tag = tag.lower()
+        if '-fonipa' in tag:
+            return 'IPPH'
+        if '-fonnapa' in tag:
+            return 'APPH'
+        lang = tag.split('-')[0]
+        if lang in self.languages:
+            return self.languages[lang][0]
+        if lang == 'zh':
+            for prefix, langsys in self.chinese:
+                if tag == prefix or tag.startswith(prefix + '-'):
+                    return langsys
+            return 'ZHS '
+        if guess and len(lang) == 3:
+            return lang.upper() + ' '
+        return None
+
+    def to_language(self, langsys):
+        """Like hb_ot_tag_to_language(), but None instead of 'x-hbot...'."""
+        if langsys in self.reverse:
+            return self.reverse[langsys][0]
+        return HARFBUZZ_REVERSE_SPECIAL.get(langsys)
+
+
+def _harfbuzz_mismatch(report, category, **entry):
+    report.setdefault(category, []).append(entry)
+
+
+def check_harfbuzz(harfbuzz, bcp47_to_opentype, opentype_to_bcp47):
+    """Compares our mappings to HarfBuzz in both directions.
+
+    Returns {'bcp47_to_opentype': {category: [mismatch]},
+             'opentype_to_bcp47': {category: [mismatch]}}
+    with categories 'missing' (no mapping on one side), 'different',
+    and 'ambiguous' (HarfBuzz lists several candidates, and picks
+    another one than we do). Tags get compared without regard to case;
+    our wildcard '*' stands for 'und'. Where HarfBuzz merely guesses
+    the language system from a three-letter code, it counts as missing
+    unless the guess agrees with us.
+    """
+    forward, reverse = {}, {}
+    ours = {k.replace('*', 'und').lower(): (k, v)
+            for k, v in bcp47_to_opentype.items()}
+    tags = set(ours) | set(harfbuzz.languages)
+    tags.update(tag for tag, _ in harfbuzz.chinese)
+    for tag in sorted(tags):
+        bcp47, langsys = ours.get(tag, (tag, None))
+        hb_langsys = harfbuzz.from_language(tag, guess=False)
+        candidates = harfbuzz.languages.get(tag, [])
+        if langsys == hb_langsys or (
+                hb_langsys is None and langsys == harfbuzz.from_language(tag)):
+            continue
+        elif langsys is None or hb_langsys is None:
+            category = 'missing'
+        elif langsys in candidates:
+            category = 'ambiguous'
+        else:
+            category = 'different'
+        _harfbuzz_mismatch(forward, category, bcp47=bcp47,
+                           ours=langsys, harfbuzz=hb_langsys)
+
+    def normalize(tag):
+        return tag.replace('*', 'und').lower() if tag else None
+
+    langsyses = set(opentype_to_bcp47) | set(harfbuzz.reverse)
+    langsyses.update(HARFBUZZ_REVERSE_SPECIAL)
+    for langsys in sorted(langsyses):
+        bcp47 = opentype_to_bcp47.get(langsys)
+        hb_bcp47 = harfbuzz.to_language(langsys)
+        candidates = [normalize(t) for t in harfbuzz.reverse.get(langsys, [])]
+        if normalize(bcp47) == normalize(hb_bcp47):
+            continue
+        elif bcp47 is None or hb_bcp47 is None:
+            category = 'missing'
+        elif normalize(bcp47) in candidates:
+            category = 'ambiguous'
+        else:
+            category = 'different'
+        _harfbuzz_mismatch(reverse, category, langsys=langsys,
+                           ours=bcp47, harfbuzz=hb_bcp47)
+
+    return {'bcp47_to_opentype': forward, 'opentype_to_bcp47': reverse}
 
 
 class TagModernizer:
     def __init__(self):
-        self.bcp47_registry = self.read_bcp47_registry()
+        self.registry = SubtagRegistry()
         self.iso639 = self.read_iso639()
         self.iso639_retirements = self.read_iso639_retirements()
-        self.bcp47_collections = set()
-        self.bcp47_languages = set()
-        for entry in self.bcp47_registry:
-            if entry['Type'] == 'language':
-                tag = entry['Subtag']
-                self.bcp47_languages.add(tag)
-                if entry.get('Scope') == 'collection':
-                    self.bcp47_collections.add(tag)
+        self.bcp47_collections = self.registry.collections
+        self.bcp47_languages = set(self.registry.by_type['language'])
 
     def modernize(self, code):
         modern = set()
@@ -303,59 +403,14 @@ class TagModernizer:
 
 
     def get_grandfatherings(self):
-        result = {}
-        for entry in self.bcp47_registry:
-            if entry['Type'] == 'grandfathered':
-                tag = entry['Tag']
-                replacements = result[tag] = set()
-                preferred = entry.get('Preferred-Value')
-                if preferred:
-                    replacements.add(preferred)
-                comments = entry.get('Comments', '')
-                if comments.startswith('see '):
-                    for code in comments[4:].split(','):
-                        replacements.add(code)
-        return result
+        return {k: set(v) for k, v in self.registry.grandfathered.items()}
 
     def get_deprecated_languages(self):
-        result = {}
-        for entry in self.bcp47_registry:
-            if entry['Type'] == 'language':
-                tag = entry['Subtag']
-                replacements = set()
-                preferred = entry.get('Preferred-Value')
-                if preferred:
-                    replacements.add(preferred)
-                comments = entry.get('Comments', '')
-                if comments.startswith('see '):
-                    for code in comments[4:].split(','):
-                        replacements.add(code)
-                if len(replacements) > 0:
-                    result[tag] = replacements
-        return result
+        return {k: set(v)
+                for k, v in self.registry.deprecated_languages.items()}
 
     def get_macrolanguages(self):
-        result = {}
-        for entry in self.bcp47_registry:
-            if entry['Type'] == 'language':
-                tag = entry['Subtag']
-                macrolang = entry.get('Macrolanguage')
-                if macrolang:
-                    result.setdefault(macrolang, set()).add(tag)
-        return result
-
-    def read_bcp47_registry(self, ):
-        entries = []
-        reg = open('language-subtag-registry', 'r').read()    
-        for entry in reg.split('%%')[1:]:
-            curEntry = {}
-            entries.append(curEntry)
-            for line in entry.split('\n'):
-                if ':' not in line: continue
-                key, value = line.split(':', 1)
-                curEntry[key] = '\n'.join(
-                    filter(None, [curEntry.get(key, ''), value])).strip()
-        return entries
+        return {k: set(v) for k, v in self.registry.macrolanguages.items()}
 
     # http://www.unicode.org/repos/cldr/trunk/tools/java/org/unicode/cldr/util/data/iso-639-3.tab
     def read_iso639(self):
@@ -417,12 +472,12 @@ def build_reverse_mapping(tags, bcp47_to_opentype):
 
     return {k: list(v)[0] for k, v in result.items()}
 
-if __name__ == '__main__':
-    tags = TagModernizer()
+def build_mappings(tags, opentype):
+    """Returns (bcp47_to_opentype, opentype_to_bcp47) as dicts."""
     bcp47_to_opentype = {k:v for k,v in SPECIAL.items()}
     opentype_languagesystems = set()
 
-    for code_iso639, langsyses in read_opentype().items():
+    for code_iso639, langsyses in opentype.items():
         for langsys in langsyses:
             opentype_languagesystems.add(langsys)
         for code_bcp47 in tags.modernize(code_iso639):
@@ -456,7 +511,7 @@ if __name__ == '__main__':
     for code in find_redundant_codes(bcp47_to_opentype):
         del bcp47_to_opentype[code]
 
-    langsyses = set([list(x)[0] for x in read_opentype().values()])
+    langsyses = set([list(x)[0] for x in opentype.values()])
     reverse_mapping = build_reverse_mapping(tags, bcp47_to_opentype)
     missing = langsyses - set(reverse_mapping.keys())
     assert len(missing) == 0, missing
@@ -471,13 +526,46 @@ if __name__ == '__main__':
         if langsys in ('DHV ', 'LCR ', 'NHC '): continue
         assert langsys == roundtripped, (langsys, bcp47, roundtripped)
 
-    if False:
-      for bcp47, hb_langsys in sorted(read_harfbuzz().items()):
-        if bcp47_to_opentype.get(bcp47) != hb_langsys:
-            print '%s --> %s, HarfBuzz would give %s' % (
-                bcp47, bcp47_to_opentype.get(bcp47), hb_langsys)
+    return bcp47_to_opentype, reverse_mapping
+
+
+# The table read by opentype_tags.py. With indent=0, every mapping
+# is on a line of its own, which keeps diffs readable.
+def write_mappings(bcp47_to_opentype, opentype_to_bcp47, path):
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as out:
+        json.dump({'bcp47_to_opentype': bcp47_to_opentype,
+                   'opentype_to_bcp47': opentype_to_bcp47},
+                  out, indent=0, separators=(',', ':'), sort_keys=True)
+        out.write('\n')
+    os.rename(tmp_path, path)
 
-    if True:
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Builds the BCP47 <--> OpenType mapping table.')
+    parser.add_argument('--output', default='mappings.json',
+                        help='where to write the table, default: %(default)s')
+    parser.add_argument('--list', action='store_true',
+                        help='also print the BCP47 --> OpenType mapping')
+    parser.add_argument('--check-harfbuzz', action='store_true',
+                        help='instead of writing the table, print how it '
+                        'differs from hb-ot-tag.cc as JSON')
+    args = parser.parse_args()
+    tags = TagModernizer()
+    opentype = read_opentype()
+    bcp47_to_opentype, reverse_mapping = build_mappings(tags, opentype)
+
+    if args.check_harfbuzz:
+        report = check_harfbuzz(HarfBuzzTags(), bcp47_to_opentype,
+                                reverse_mapping)
+        json.dump(report, sys.stdout, indent=1, separators=(',', ': '),
+                  sort_keys=True)
+        sys.stdout.write('\n')
+        sys.exit(0)
+
+    write_mappings(bcp47_to_opentype, reverse_mapping, args.output)
+    if args.list:
         for code, langsys in sorted(bcp47_to_opentype.items()):
             print code, langsys
         #for langsys, bcp47 in sorted(reverse_mapping.items()):
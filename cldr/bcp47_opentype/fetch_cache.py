@@ -0,0 +1 @@
+../../fetch_cache.py
\ No newline at end of file
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+# Canonicalizes BCP47 language tags, one per line, from stdin to stdout.
+#
+#     $ printf 'iw_il\nzh-yue-HK\ndeu-DD-u-nu-latn\ni-klingon\n' | \
+#           python normalize_tags.py
+#     he-IL
+#     yue-HK
+#     de-DE-u-nu-latn
+#     tlh
+#
+# Grandfathered and redundant tags, extended language subtags and
+# deprecated subtags get replaced by their preferred values, and ISO 639-3
+# codes by their shortest form, as in build_mappings.TagModernizer. With
+# --macrolanguages, member languages also get folded into their
+# macrolanguage, such as 'cmn' --> 'zh'. Extensions are kept, sorted by
+# their singleton, with private use subtags at the end. Lines that do not
+# look like language tags get passed through unchanged.
+#
+# Because the tags of crawled documents are very skewed, results get
+# cached; for large inputs, use -j to spread the work across processes.
+
+import argparse
+import collections
+import multiprocessing
+import os
+import sys
+
+from build_mappings import TagModernizer
+
+# Input lines get sent to worker processes in batches of this size.
+BATCH_SIZE = 10000
+
+
+class LRUCache(object):
+    """Keeps the maxsize most recently used entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            return default
+        self._entries[key] = value
+        return value
+
+    def put(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+# 'ZH-hant' --> 'Hant', 'hk' --> 'HK', 'FONIPA' --> 'fonipa'
+def _case_subtag(index, subtag):
+    if index > 0 and len(subtag) == 4 and subtag[0].isalpha():
+        return subtag.title()
+    elif index > 0 and len(subtag) == 2:
+        return subtag.upper()
+    else:
+        return subtag.lower()
+
+
+# 'de-CH-x-foo-u-nu-thai' --> (['de', 'CH'], [['u', 'nu', 'thai']], ['x', 'foo'])
+# Returns None for things that are not language tags.
+def _split_tag(tag):
+    subtags = tag.replace('_', '-').split('-')
+    if not all(s.isalnum() and len(s) <= 8 for s in subtags):
+        return None
+    main, extensions, private = [], [], []
+    for i, subtag in enumerate(subtags):
+        if private:
+            private.append(subtag.lower())
+        elif subtag.lower() == 'x':
+            private.append('x')
+        elif (len(subtag) == 1 and i > 0) or extensions:
+            if len(subtag) == 1:
+                extensions.append([])
+            extensions[-1].append(subtag.lower())
+        else:
+            main.append(_case_subtag(i, subtag))
+    if not main or any(len(e) < 2 for e in extensions) or private == ['x']:
+        return None
+    return main, extensions, private
+
+
+class TagNormalizer(object):
+    def __init__(self, fold_macrolanguages=False, cache_size=100000):
+        self.tags = TagModernizer()
+        self.registry = self.tags.registry
+        self.fold_macrolanguages = fold_macrolanguages
+        self.cache = LRUCache(cache_size)
+        # Grandfathered and redundant tags with a preferred value,
+        # keyed by lowercase tag, such as 'zh-min-nan' --> 'nan'.
+        self.preferred_tags = {}
+        for type_ in ('grandfathered', 'redundant'):
+            for tag, index in self.registry.by_type[type_].items():
+                preferred = self.registry.records[index].get('Preferred-Value')
+                if preferred:
+                    self.preferred_tags[tag.lower()] = str(preferred)
+
+    def normalize(self, tag):
+        result = self.cache.get(tag)
+        if result is None:
+            result = self._normalize(tag)
+            self.cache.put(tag, result)
+        return result
+
+    def _normalize(self, tag):
+        # A whole grandfathered or redundant tag gets replaced by its
+        # preferred value, which then gets normalized like any other tag.
+        tag = self.preferred_tags.get(tag.replace('_', '-').lower(), tag)
+        split = _split_tag(tag)
+        if split is None:
+            return tag
+        main, extensions, private = split
+        for i in range(len(main), 1, -1):
+            preferred = self.preferred_tags.get('-'.join(main[:i]).lower())
+            if preferred:
+                main = preferred.split('-') + main[i:]
+                break
+        extlang = self.registry.get('extlang', main[1]) \
+            if len(main) > 1 else None
+        if extlang and main[0] in extlang.get('Prefix', '').split('\n'):
+            main = [str(extlang['Preferred-Value'])] + main[2:]
+        main[0] = self._normalize_language(main[0])
+        for i in range(1, len(main)):
+            main[i] = self._normalize_subtag(main[i])
+        result = []
+        for subtag in main:
+            if subtag not in result:  # duplicate variants
+                result.append(subtag)
+        for extension in sorted(extensions):
+            result.extend(extension)
+        result.extend(private)
+        return '-'.join(result)
+
+    def _normalize_language(self, lang):
+        if lang in self.tags.iso639 or lang in self.tags.iso639_retirements:
+            try:
+                modern = self.tags.modernize(lang)
+            except KeyError:  # retired without a replacement in ISO 639-3
+                modern = set()
+            if len(modern) == 1:
+                lang = modern.pop()
+        record = self.registry.get('language', lang)
+        if record is None:
+            return lang
+        if record.get('Preferred-Value'):
+            lang = str(record['Preferred-Value'])
+            record = self.registry.get('language', lang) or {}
+        if self.fold_macrolanguages and record.get('Macrolanguage'):
+            lang = str(record['Macrolanguage'])
+        return lang
+
+    def _normalize_subtag(self, subtag):
+        for type_ in ('script', 'region', 'variant'):
+            record = self.registry.get(type_, subtag)
+            if record is not None:
+                return str(record.get('Preferred-Value', subtag))
+        return subtag
+
+
+def read_batches(lines, size):
+    batch = []
+    for line in lines:
+        batch.append(line.rstrip('\r\n'))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_normalizer = None
+
+
+def _init_worker(fold_macrolanguages, cache_size):
+    global _normalizer
+    _normalizer = TagNormalizer(fold_macrolanguages, cache_size)
+
+
+# Each distinct tag of a batch gets looked up once, which saves most of
+# the (pure Python) cache bookkeeping on skewed inputs.
+def _normalize_batch(batch):
+    normalized = {tag: _normalizer.normalize(tag) + '\n'
+                  for tag in set(batch)}
+    return ''.join([normalized[tag] for tag in batch])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Canonicalizes BCP47 language tags, one per line.')
+    parser.add_argument('--macrolanguages', action='store_true',
+                        help='fold member languages into their macrolanguage')
+    parser.add_argument('--cache-size', type=int, default=100000,
+                        help='number of tags to cache, default: %(default)s')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes')
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    initargs = (args.macrolanguages, args.cache_size)
+    batches = read_batches(sys.stdin, BATCH_SIZE)
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs, _init_worker, initargs)
+        results = pool.imap(_normalize_batch, batches)
+    else:
+        pool = None
+        _init_worker(*initargs)
+        results = (_normalize_batch(batch) for batch in batches)
+    for result in results:
+        sys.stdout.write(result)
+    if pool is not None:
+        pool.close()
+        pool.join()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
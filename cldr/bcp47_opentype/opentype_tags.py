@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# Maps between BCP47 language tags and OpenType language systems.
+#
+#     >>> from opentype_tags import bcp47_to_opentype, opentype_to_bcp47
+#     >>> bcp47_to_opentype('hy-arevmda')
+#     'HYE '
+#     >>> bcp47_to_opentype('de-CH-fonipa')
+#     'IPPH'
+#     >>> opentype_to_bcp47('KGE')
+#     'ka-Geok'
+#
+# The table in mappings.json gets generated by build_mappings.py.
+
+import json
+import os
+
+MAPPINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'mappings.json')
+
+_tables = {}
+
+# Lookups are memoized per input; the memo gets cleared when it grows
+# beyond this many entries.
+MAX_MEMO_SIZE = 100000
+_memo = {}
+
+
+def _get_table(name):
+    if not _tables:
+        with open(MAPPINGS_PATH, 'r') as f:
+            tables = json.load(f)
+        # Plain str keys and values, so lookups need no conversion.
+        for key, table in tables.items():
+            _tables[str(key)] = {str(k): str(v) for k, v in table.items()}
+    return _tables[name]
+
+
+# 'ZH-hant-hk' --> ['zh', 'Hant', 'HK']; extensions and private use
+# subtags get dropped. Grandfathered tags such as 'i-navajo' start with
+# a singleton, which we keep.
+def _split_tag(tag):
+    subtags = []
+    for i, subtag in enumerate(tag.replace('_', '-').split('-')):
+        if len(subtag) == 1 and i > 0:
+            break
+        if i > 0 and len(subtag) == 4 and subtag[0].isalpha():
+            subtags.append(subtag.title())  # script
+        elif i > 0 and len(subtag) == 2:
+            subtags.append(subtag.upper())  # region
+        else:
+            subtags.append(subtag.lower())
+    return subtags
+
+
+def bcp47_to_opentype(tag):
+    """'de-CH-fonipa' --> 'IPPH', or None if there is no mapping
+
+    Tries the full tag first, then the wildcard entries for each subtag
+    such as '*-fonipa', then ever shorter prefixes of the tag, then the
+    language with any one of its other subtags ('zh-Hant-HK' --> 'zh-HK'),
+    and finally the language alone.
+    """
+    result = _memo.get(tag, False)
+    if result is not False:
+        return result
+    table = _get_table('bcp47_to_opentype')
+    subtags = _split_tag(tag)
+    result = table.get('-'.join(subtags))
+    if result is None:
+        for subtag in subtags[1:]:
+            result = table.get('*-' + subtag)
+            if result is not None:
+                break
+    if result is None:
+        for i in range(len(subtags) - 1, 1, -1):
+            result = table.get('-'.join(subtags[:i]))
+            if result is not None:
+                break
+    if result is None:
+        for subtag in subtags[2:]:
+            result = table.get('%s-%s' % (subtags[0], subtag))
+            if result is not None:
+                break
+    if result is None:
+        result = table.get(subtags[0])
+    if len(_memo) >= MAX_MEMO_SIZE:
+        _memo.clear()
+    _memo[tag] = result
+    return result
+
+
+def opentype_to_bcp47(langsys):
+    """'KGE' or 'KGE ' --> 'ka-Geok', or None if there is no mapping"""
+    return _get_table('opentype_to_bcp47').get(langsys.ljust(4))
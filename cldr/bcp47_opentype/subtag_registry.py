@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+# Reads the IANA language subtag registry, indexed for lookups.
+#
+#     >>> registry = SubtagRegistry()
+#     >>> registry.get('language', 'mo')['Preferred-Value']
+#     'ro'
+#     >>> sorted(registry.macrolanguages['zh'])[:3]
+#     ['cdo', 'cjy', 'cmn']
+#
+# The indexes get built in a single pass over the registry, and are
+# cached on disk under the registry's File-Date.
+
+import io
+import json
+import os
+import tempfile
+
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'language-subtag-registry')
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'cldr-playground-cache')
+
+
+def read_records(lines):
+    """Yields one dict per registry record, starting with the File-Date.
+
+    Fields that occur more than once, such as Description, get joined
+    by newlines. Folded lines get unfolded.
+    """
+    record, key = {}, None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line == '%%':
+            yield {k: '\n'.join(v) for k, v in record.items()}
+            record, key = {}, None
+        elif line[:1].isspace():
+            record[key][-1] += ' ' + line.strip()
+        elif ':' in line:
+            key, value = line.split(':', 1)
+            record.setdefault(key, []).append(value.strip())
+    if record:
+        yield {k: '\n'.join(v) for k, v in record.items()}
+
+
+# The Preferred-Value and the codes from comments such as 'see apf, prf'.
+# As in the past, the codes are not stripped, so ' prf' will not match any
+# mapping; stripping them would make some deprecated tags ambiguous.
+def get_replacements(record):
+    replacements = set()
+    preferred = record.get('Preferred-Value')
+    if preferred:
+        replacements.add(preferred)
+    comments = record.get('Comments', '')
+    if comments.startswith('see '):
+        for code in comments[4:].split(','):
+            replacements.add(code)
+    return replacements
+
+
+class SubtagRegistry(object):
+    """Indexes over the records of the language subtag registry.
+
+    records: list of dicts, one per record, without the File-Date
+    by_type: {type: {subtag or tag: index into records}}
+    by_subtag: {lowercase subtag or tag: [index into records]}
+    deprecated_languages: {language: set(replacements)}
+    grandfathered: {tag: set(replacements)}
+    macrolanguages: {macrolanguage: set(member languages)}
+    collections: set(languages whose scope is collection)
+    """
+
+    def __init__(self, path=REGISTRY_PATH):
+        with io.open(path, 'r', encoding='utf-8') as f:
+            self.file_date = f.readline().split(':', 1)[1].strip()
+        cache_path = os.path.join(
+            CACHE_DIR, 'language-subtag-registry-%s.json' % self.file_date)
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                self._load(json.load(f))
+        else:
+            with io.open(path, 'r', encoding='utf-8') as f:
+                self._build(f)
+            self._save(cache_path)
+
+    def get(self, type_, subtag):
+        index = self.by_type.get(type_, {}).get(subtag)
+        return self.records[index] if index is not None else None
+
+    def _build(self, lines):
+        self.records, self.by_type, self.by_subtag = [], {}, {}
+        self.deprecated_languages, self.grandfathered = {}, {}
+        self.macrolanguages, self.collections = {}, set()
+        records = read_records(lines)
+        next(records)  # File-Date
+        for index, record in enumerate(records):
+            self.records.append(record)
+            type_ = record['Type']
+            tag = record.get('Subtag') or record['Tag']
+            self.by_type.setdefault(type_, {})[tag] = index
+            self.by_subtag.setdefault(tag.lower(), []).append(index)
+            if type_ == 'language':
+                replacements = get_replacements(record)
+                if replacements:
+                    self.deprecated_languages[tag] = replacements
+                macrolanguage = record.get('Macrolanguage')
+                if macrolanguage:
+                    self.macrolanguages.setdefault(
+                        macrolanguage, set()).add(tag)
+                if record.get('Scope') == 'collection':
+                    self.collections.add(tag)
+            elif type_ == 'grandfathered':
+                self.grandfathered[tag] = get_replacements(record)
+
+    def _load(self, cached):
+        self.records = cached['records']
+        self.by_type = cached['by_type']
+        self.by_subtag = cached['by_subtag']
+        self.deprecated_languages = {
+            k: set(v) for k, v in cached['deprecated_languages'].items()}
+        self.grandfathered = {
+            k: set(v) for k, v in cached['grandfathered'].items()}
+        self.macrolanguages = {
+            k: set(v) for k, v in cached['macrolanguages'].items()}
+        self.collections = set(cached['collections'])
+
+    def _save(self, cache_path):
+        cached = {
+            'records': self.records,
+            'by_type': self.by_type,
+            'by_subtag': self.by_subtag,
+            'deprecated_languages': {
+                k: sorted(v) for k, v in self.deprecated_languages.items()},
+            'grandfathered': {
+                k: sorted(v) for k, v in self.grandfathered.items()},
+            'macrolanguages': {
+                k: sorted(v) for k, v in self.macrolanguages.items()},
+            'collections': sorted(self.collections),
+        }
+        if not os.path.exists(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+        tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+        with open(tmp_path, 'w') as out:
+            out.write(json.dumps(cached, sort_keys=True))
+        os.rename(tmp_path, cache_path)
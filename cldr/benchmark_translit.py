@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+# Measures how fast our transliteration rules are.
+#
+# For every rule set with test data, we measure compile time and replay
+# the test inputs, followed by synthetic corpora that are 10 and 100 times
+# larger. The synthetic words are drawn from the test inputs, and every
+# fifth one is a compound of two inputs.
+#
+#     $ python benchmark_translit.py --save baseline.json
+#     ... edit rules ...
+#     $ python benchmark_translit.py --baseline baseline.json
+#
+# With --baseline, rule sets whose throughput dropped by more than
+# --tolerance get flagged, and the exit status is 1.
+
+from __future__ import unicode_literals
+import argparse
+import codecs
+import icu
+import json
+import os
+import random
+import sys
+import timeit
+
+import cldr_util
+from run_translit_tests import find_suites, get_language
+
+SCALES = (1, 10, 100)
+
+
+def make_corpus(words, scale):
+    if scale == 1:
+        return list(words)
+    rand = random.Random(scale)  # same corpus on every run
+    corpus = []
+    for i in range(len(words) * scale):
+        word = rand.choice(words)
+        if i % 5 == 4:
+            word += rand.choice(words)
+        corpus.append(word)
+    return corpus
+
+
+def percentile(sorted_values, p):
+    return sorted_values[int(round(p * (len(sorted_values) - 1)))]
+
+
+def measure_compile(translit_name, repeat):
+    rules, _ = cldr_util.read_rules('rules/%s.txt' % translit_name)
+    best = None
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        translit = icu.Transliterator.createFromRules(
+            translit_name, rules, icu.UTransDirection.FORWARD)
+        elapsed = timeit.default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return translit, best
+
+
+def measure_throughput(translit, corpus, repeat):
+    timer = timeit.default_timer
+    best_total, best_latencies = None, None
+    for _ in range(repeat):
+        latencies = []
+        for word in corpus:
+            start = timer()
+            translit.transliterate(word)
+            latencies.append(timer() - start)
+        total = sum(latencies)
+        if best_total is None or total < best_total:
+            best_total, best_latencies = total, latencies
+    best_latencies.sort()
+    return {
+        'words': len(corpus),
+        'words_per_sec': len(corpus) / best_total,
+        'p50_us': percentile(best_latencies, 0.5) * 1e6,
+        'p99_us': percentile(best_latencies, 0.99) * 1e6,
+    }
+
+
+def benchmark(translit_name, repeat):
+    translit, compile_time = measure_compile(translit_name, repeat)
+    words = [graph for _, graph, _ in
+             cldr_util.read_testcases('test/%s.txt' % translit_name)
+             if graph is not None]
+    result = {'compile_ms': compile_time * 1e3, 'scales': {}}
+    for scale in SCALES:
+        result['scales'][str(scale)] = measure_throughput(
+            translit, make_corpus(words, scale), repeat)
+    return result
+
+
+def find_regressions(results, baseline, tolerance):
+    for translit_name, result in sorted(results.items()):
+        old = baseline.get(translit_name)
+        if not old:
+            continue
+        for scale, stats in sorted(result['scales'].items()):
+            old_stats = old['scales'].get(scale)
+            if not old_stats:
+                continue
+            ratio = stats['words_per_sec'] / old_stats['words_per_sec']
+            if ratio < 1.0 - tolerance:
+                yield ('%s: x%s is %.0f%% slower than baseline '
+                       '(%.0f instead of %.0f words/sec)' %
+                       (translit_name, scale, (1.0 - ratio) * 100,
+                        stats['words_per_sec'], old_stats['words_per_sec']))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the transliteration rules.')
+    parser.add_argument('languages', nargs='*',
+                        help='only benchmark these, such as "am" or "ta_LK"')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='take the best of this many runs')
+    parser.add_argument('--save', metavar='FILE',
+                        help='write the results as JSON')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='compare against results saved earlier')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='flag slowdowns beyond this fraction')
+    args = parser.parse_args()
+    save_path = os.path.abspath(args.save) if args.save else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    suites = find_suites()
+    if args.languages:
+        suites = [s for s in suites if get_language(s) in args.languages]
+    results = {}
+    print('%-22s %9s %6s %8s %12s %8s %8s' % (
+        'rules', 'compile', 'scale', 'words', 'words/sec', 'p50', 'p99'))
+    for translit_name in suites:
+        result = results[translit_name] = benchmark(translit_name,
+                                                    args.repeat)
+        for scale in SCALES:
+            stats = result['scales'][str(scale)]
+            print('%-22s %7.2fms %5dx %8d %12.0f %6.1fus %6.1fus' % (
+                translit_name, result['compile_ms'], scale, stats['words'],
+                stats['words_per_sec'], stats['p50_us'], stats['p99_us']))
+
+    if save_path:
+        with codecs.open(save_path, 'w', 'utf-8') as out:
+            json.dump(results, out, indent=2, sort_keys=True)
+    if baseline_path:
+        with codecs.open(baseline_path, 'r', 'utf-8') as f:
+            baseline = json.load(f)
+        regressions = list(find_regressions(
+            results, baseline, args.tolerance))
+        for regression in regressions:
+            print(regression.encode('utf-8'))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
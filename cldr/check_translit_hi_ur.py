@@ -1,18 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 import codecs
-import icu
+
+from cldr_util import load_transliterator
 
 class HindiUrduTransform(object):
     def __init__(self):
-        with open('Devanagari-InterIndic.txt') as rules:
-            self.fromHindi = icu.Transliterator.createFromRules(
-                'Hindi-InterIndic', rules.read(),
-                icu.UTransDirection.FORWARD)
-        with open('InterIndic-Urdu.txt') as rules:
-            self.toUrdu = icu.Transliterator.createFromRules(
-                'InterIndic-Urdu', rules.read(),
-                icu.UTransDirection.FORWARD)
+        self.fromHindi = load_transliterator(
+            'Hindi-InterIndic', 'Devanagari-InterIndic.txt')
+        self.toUrdu = load_transliterator(
+            'InterIndic-Urdu', 'InterIndic-Urdu.txt')
 
     def transliterate(self, s):
         interindic = self.fromHindi.transliterate(s)
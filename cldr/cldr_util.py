@@ -2,9 +2,34 @@
 from __future__ import unicode_literals
 import codecs
 import icu
+import json
+import multiprocessing
+import os
 import re
+import tempfile
 import unicodedata
 
+# Where our tools keep derived data between runs.
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'cldr-playground-cache')
+
+
+def read_cache(name, default=None):
+    path = os.path.join(CACHE_DIR, name)
+    if not os.path.exists(path):
+        return default
+    with codecs.open(path, 'r', 'utf-8') as f:
+        return json.load(f)
+
+
+def write_cache(name, value):
+    if not os.path.exists(CACHE_DIR):
+        os.makedirs(CACHE_DIR)
+    path = os.path.join(CACHE_DIR, name)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with codecs.open(tmp_path, 'w', 'utf-8') as f:
+        json.dump(value, f, indent=2, sort_keys=True)
+    os.rename(tmp_path, path)
+
 
 def makePhonemeSet(s):
     pat = []
@@ -13,12 +38,48 @@ def makePhonemeSet(s):
             pat.append(phoneme)
         else:
             pat.append('{%s}' % phoneme)
-    print ' '.join(pat).encode('utf-8')
     result = icu.UnicodeSet()
     result.applyPattern('[%s]' % ' '.join(pat))
     return result
 
 
+INVENTORY_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'inventories')
+_inventories = {}  # language --> (graphemes, phonemes)
+
+
+# Parses 'key: value' lines; indented lines continue the previous value.
+def _read_inventory_file(path):
+    fields, key = {}, None
+    for line in codecs.open(path, 'r', 'utf-8'):
+        line = line.split('#')[0].rstrip()
+        if not line.strip():
+            continue
+        if line[0].isspace():
+            fields[key] = fields[key] + ' ' + line.strip()
+        else:
+            key, value = line.split(':', 1)
+            fields[key] = value.strip()
+    return fields
+
+
+def get_inventory(lang):
+    """'am' --> (graphemes, phonemes) as frozen icu.UnicodeSets
+
+    The inventories are defined in inventories/<lang>.txt. Each gets
+    loaded on first use and is then shared by all callers.
+    """
+    if lang not in _inventories:
+        fields = _read_inventory_file(
+            os.path.join(INVENTORY_DIR, '%s.txt' % lang))
+        graphemes = icu.UnicodeSet(fields['graphemes'])
+        phonemes = makePhonemeSet(fields['phonemes'])
+        graphemes.freeze()
+        phonemes.freeze()
+        _inventories[lang] = (graphemes, phonemes)
+    return _inventories[lang]
+
+
 def match(s, unicodeset):
     return icu.UnicodeSet.span(
         unicodeset, s, icu.USetSpanCondition.SPAN_CONTAINED) == len(s)
@@ -70,58 +131,201 @@ WHITELISTED_SPECIAL_RULES = [
 ]
 
 
-def check_nfc(path):
+# Compiled transliterators are kept in memory, one per rules file, and
+# get replaced when the file changes. ICU cannot serialize compiled rules.
+# We do not compile NFC-normalized rules because normalizing changes their
+# meaning: for example, NFC decomposes U+0958 DEVANAGARI LETTER QA, whose
+# rule would then be hidden by क.
+_transliterators = {}  # (translit_id, path) --> (key, Transliterator)
+
+
+def _file_key(path):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return (path, repr(stat.st_mtime), stat.st_size)
+
+
+def read_rules(path):
+    """path --> (rules, whether they are in normalization form NFC)"""
+    with codecs.open(path, 'r', 'utf-8') as f:
+        rules = f.read()
+    return rules, rules == unicodedata.normalize('NFC', rules)
+
+
+def load_transliterator(translit_id, path):
+    key = _file_key(path)
+    cached_key, translit = _transliterators.get(
+        (translit_id, key[0]), (None, None))
+    if cached_key != key:
+        rules, _ = read_rules(path)
+        translit = icu.Transliterator.createFromRules(
+            translit_id, rules, icu.UTransDirection.FORWARD)
+        _transliterators[(translit_id, key[0])] = (key, translit)
+    return translit
+
+
+def report(errors):
+    num_errors = 0
+    for error in errors:
+        print(error.encode('utf-8'))
+        num_errors += 1
+    return num_errors
+
+
+def nfc_errors(path):
     with codecs.open(path, 'r', 'utf-8') as f:
         text = f.read()
     if text != unicodedata.normalize('NFC', text):
-        print('%s: Not in normalization form NFC' % path)
+        yield '%s: Not in normalization form NFC' % path
 
 
-def check(path, graphemes, phonemes):
-    prefixes = {}
-    num_lines = 0
-    for line in codecs.open('rules/%s.txt' % path, 'r', 'utf-8'):
-        num_lines += 1
-        line = line.split('#')[0].strip()
-        if not line or line[0] in ':$[' or '$' in line:
-            continue
-        if line[-1] != ';':
-            error = '%s:%d: line should end in ;' % (path, num_lines)
-            print(error.encode('utf-8'))
-            continue
-        if line in WHITELISTED_SPECIAL_RULES:
+def check_nfc(path):
+    return report(nfc_errors(path))
+
+
+# 'ሀ → ha;  # comment' --> ('ሀ → ha;', 'ሀ', 'ha')
+#
+# Returns None for lines that are no plain rules, such as variables,
+# filters, the end of multi-line statements or whitelisted special cases.
+# Bidirectional 'a ↔ b;' rules get parsed like 'a → b;'; backward 'a ← b;'
+# rules get None, since they never apply when transliterating forward.
+# For rules that do not end in a semicolon, graph and phon are None.
+def parse_rule(line):
+    line = line.split('#')[0].strip()
+    if not line or line[0] in ':$[' or '$' in line:
+        return None
+    if line[-1] != ';':
+        return (line, None, None)
+    if line in WHITELISTED_SPECIAL_RULES:
+        return None
+    if '→' not in line and '↔' not in line:
+        return None
+    line = line.replace('\\.', '.').replace("''", "")
+    line = re.sub(r'\\u([0-9a-fA-F]{4})',
+                  lambda m: unichr(int(m.group(1), 16)),
+                  line)
+    line =  line.replace("' '", "\\u0020")
+    graph, phon = re.split('[→↔]', line[:-1], 1)
+    graph, phon = graph.strip(), phon.strip()
+    for g in '{}[] ': graph = graph.replace(g, '')
+    for p in '. ': phon = phon.replace(p, '')
+    return (line, graph, phon)
+
+
+class RuleIndex(object):
+    """Trie over the left-hand sides of a rules file.
+
+    ICU applies the first rule that matches, so a rule gets hidden
+    by any earlier rule whose graphemes are a prefix of its own.
+    After an edit, call update() again; only lines that have changed
+    since the last call get re-parsed, so an editor or watch mode can
+    re-lint after every keystroke.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parsed = {}  # line --> parse_rule(line)
+        self.rules = []  # [(line number, line, graph, phon)]
+        self.passes = []  # line numbers of '::' lines that start a new pass
+        self.hidden_by = {}  # line number --> (prefix, line number)
+        self.update()
+
+    def update(self, lines=None):
+        if lines is None:
+            with codecs.open(self.path, 'r', 'utf-8') as f:
+                lines = f.readlines()
+        parsed = {}
+        self.rules, self.passes = [], []
+        for num_lines, line in enumerate(lines, 1):
+            if line.lstrip().startswith('::'):
+                self.passes.append(num_lines)
+            rule = parsed.get(line) or self.parsed.get(line)
+            if rule is None:
+                rule = parse_rule(line)
+            parsed[line] = rule
+            if rule is not None:
+                self.rules.append((num_lines,) + rule)
+        self.parsed = parsed
+        self.build_trie()
+
+    def build_trie(self):
+        # Every node is a dict from character to child node; the key None
+        # holds the line number of the first rule ending at that node.
+        # Each pass gets its own trie.
+        self.hidden_by = {}
+        passes = iter(self.passes + [None])
+        next_pass, trie = next(passes), {}
+        for num_lines, line, graph, phon in self.rules:
+            while next_pass is not None and next_pass < num_lines:
+                next_pass, trie = next(passes), {}
+            if not graph:
+                continue
+            node = trie
+            for i, c in enumerate(graph):
+                if None in node:
+                    self.hidden_by[num_lines] = (graph[:i], node[None])
+                    break
+                node = node.setdefault(c, {})
+            else:
+                if None in node:  # same graphemes as an earlier rule
+                    self.hidden_by[num_lines] = (graph, node[None])
+                else:
+                    node[None] = num_lines
+
+
+def check_errors(path, graphemes, phonemes, index=None):
+    if index is None:
+        index = RuleIndex('rules/%s.txt' % path)
+    for num_lines, line, graph, phon in index.rules:
+        if graph is None:
+            yield '%s:%d: line should end in ;' % (path, num_lines)
             continue
-        line = line.replace('\\.', '.').replace("''", "")
-        line = re.sub(r'\\u([0-9a-fA-F]{4})',
-                      lambda m: unichr(int(m.group(1), 16)),
-                      line)
-        line =  line.replace("' '", "\\u0020")
-        graph, phon = line[:-1].split('→')
-        graph, phon = graph.strip(), phon.strip()
-        for g in '{}[] ': graph = graph.replace(g, '')
-        for p in '. ': phon = phon.replace(p, '')
-        if graph[:-1] in prefixes:
-            error = ('%s:%d: %s hidden by %s, defined on line %d' %
-                     (path, num_lines, graph, graph[:-1], prefixes[graph[:-1]]))
-            print(error.encode('utf-8'))
-        else:
-            prefixes[graph] = num_lines
+        if num_lines in index.hidden_by:
+            prefix, prefix_line = index.hidden_by[num_lines]
+            yield ('%s:%d: %s hidden by %s, defined on line %d' %
+                   (path, num_lines, graph, prefix, prefix_line))
         if not match(graph, graphemes):
-            print(('%s:%d: Unexpected graphemes in "%s"' %
-                  (path, num_lines, line)).encode('utf-8'))
+            yield ('%s:%d: Unexpected graphemes in "%s"' %
+                   (path, num_lines, line))
         if not match(phon, phonemes) and phon not in ['\\u0020']:
-            print(('%s:%d: Unexpected phonemes in "%s"' %
-                   (path, num_lines, line)).encode('utf-8'))
+            yield ('%s:%d: Unexpected phonemes in "%s"' %
+                   (path, num_lines, line))
+
+
+def check(path, graphemes, phonemes):
+    return report(check_errors(path, graphemes, phonemes))
+
+
+# Separates test inputs when checking them against an inventory in
+# batches. This is a noncharacter, which no inventory contains.
+BATCH_SEPARATOR = '\ufdd0'
+
+
+def match_batch(texts, unicodeset):
+    uset = icu.UnicodeSet()  # copies of frozen sets would be frozen, too
+    uset.addAll(unicodeset)
+    uset.add(BATCH_SEPARATOR)
+    uset.freeze()
+    if match(BATCH_SEPARATOR.join(texts), uset):
+        return [True] * len(texts)
+    return [match(t, unicodeset) for t in texts]
+
+
+_testcases = {}  # path --> (key, [(line number, graph, phon)])
+
 
+# Returns (line number, graph, expected phonemes) for every test case.
+# For malformed lines, graph is None and the third item is the line.
+# The result is kept in memory until the file changes.
+def read_testcases(test_path):
+    key = _file_key(test_path)
+    if _testcases.get(key[0], (None,))[0] != key:
+        _testcases[key[0]] = (key, list(_parse_testcases(test_path)))
+    return _testcases[key[0]][1]
 
-def regtest(translit_name, graphemes, phonemes):
-    check_nfc('rules/%s.txt' % translit_name)
-    rules = codecs.open('rules/%s.txt' % translit_name, 'r', 'utf-8').read()
-    translit = icu.Transliterator.createFromRules(
-        translit_name, rules, icu.UTransDirection.FORWARD)
+
+def _parse_testcases(test_path):
     num_lines = 0
-    test_path = 'test/%s.txt' % translit_name
-    check_nfc(test_path)
     for line in codecs.open(test_path, 'r', 'utf-8'):
         num_lines += 1
         if not line.strip() or line.startswith('#'):
@@ -129,21 +333,190 @@ def regtest(translit_name, graphemes, phonemes):
         try:
             graph, expected_ipa = line.strip().split('\t')
         except ValueError:
-            print(('%s:%d: Invalid testcase format "%s"' %
-                   (test_path, num_lines, line.strip())).encode('utf-8'))
+            yield (num_lines, None, line.strip())
             continue
-        if False:
-            actual_ipa = translit.transliterate(graph).strip()
-            print((u'%s\t%s' % (graph.strip(), actual_ipa)).encode('utf-8'))
+        yield (num_lines, graph, expected_ipa)
+
+
+# With batch_size, test inputs and expected outputs get checked against
+# the inventories batch_size lines at a time, joined by BATCH_SEPARATOR,
+# which gives the same results as line by line. Transliteration always
+# works one line at a time, since rules may look at the start or end of
+# the text, or at context beyond any separator.
+#
+# Failures are dicts with a 'type', one of the keys of FAILURE_MESSAGES,
+# the 'path' of the offending file and, where known, the 'line' number
+# together with the test case's 'input', 'expected' and 'actual' values.
+def regtest_failures(translit_name, graphemes, phonemes, batch_size=None):
+    rules_path = 'rules/%s.txt' % translit_name
+    if not read_rules(rules_path)[1]:
+        yield {'type': 'not-nfc', 'path': rules_path}
+    translit = load_transliterator(translit_name, rules_path)
+    test_path = 'test/%s.txt' % translit_name
+    for _ in nfc_errors(test_path):
+        yield {'type': 'not-nfc', 'path': test_path}
+    testcases = read_testcases(test_path)
+    graphs = [graph for _, graph, _ in testcases if graph is not None]
+    expected = [ipa for _, graph, ipa in testcases if graph is not None]
+    if batch_size:
+        graphs_ok, expected_ok = [], []
+        for i in range(0, len(graphs), batch_size):
+            graphs_ok.extend(match_batch(graphs[i:i+batch_size], graphemes))
+            expected_ok.extend(
+                match_batch(expected[i:i+batch_size], phonemes))
+    i = 0
+    for num_lines, graph, expected_ipa in testcases:
+        if graph is None:
+            yield {'type': 'invalid-testcase', 'path': test_path,
+                   'line': num_lines, 'text': expected_ipa}
             continue
-        if not match(graph, graphemes):
-            print(('%s:%d: Unexpected graphemes in "%s"' %
-                  (test_path, num_lines, graph)).encode('utf-8'))
-        if not match(expected_ipa, phonemes):
-            print(('%s:%d: Unexpected phonemes in "%s"' %
-                   (test_path, num_lines, expected_ipa)).encode('utf-8'))
+        if batch_size:
+            graph_ok, expected_ipa_ok = graphs_ok[i], expected_ok[i]
+            i += 1
+        else:
+            graph_ok = match(graph, graphemes)
+            expected_ipa_ok = match(expected_ipa, phonemes)
         actual_ipa = translit.transliterate(graph)
+        if False:
+            print((u'%s\t%s' % (graph.strip(), actual_ipa.strip()))
+                  .encode('utf-8'))
+            continue
+        testcase = {'path': test_path, 'line': num_lines, 'input': graph,
+                    'expected': expected_ipa, 'actual': actual_ipa}
+        if not graph_ok:
+            yield dict(testcase, type='unexpected-graphemes')
+        if not expected_ipa_ok:
+            yield dict(testcase, type='unexpected-phonemes')
         if actual_ipa != expected_ipa:
-            print(('%s:%d: Expected "%s" but got "%s" for "%s"' %
-                   (test_path, num_lines,
-                    expected_ipa, actual_ipa, graph)).encode('utf-8'))
+            yield dict(testcase, type='mismatch')
+
+
+FAILURE_MESSAGES = {
+    'not-nfc': '%(path)s: Not in normalization form NFC',
+    'invalid-testcase':
+        '%(path)s:%(line)d: Invalid testcase format "%(text)s"',
+    'unexpected-graphemes':
+        '%(path)s:%(line)d: Unexpected graphemes in "%(input)s"',
+    'unexpected-phonemes':
+        '%(path)s:%(line)d: Unexpected phonemes in "%(expected)s"',
+    'mismatch': ('%(path)s:%(line)d: Expected "%(expected)s" '
+                 'but got "%(actual)s" for "%(input)s"'),
+}
+
+
+def format_failure(failure):
+    return FAILURE_MESSAGES[failure['type']] % failure
+
+
+def regtest_errors(translit_name, graphemes, phonemes, batch_size=None):
+    for failure in regtest_failures(translit_name, graphemes, phonemes,
+                                    batch_size=batch_size):
+        yield format_failure(failure)
+
+
+# Splits rules into statements, which may span several lines.
+# Returns [(first line number, last line number, statement)] for all
+# conversion rules, leaving out variable definitions and '::' passes.
+def find_rule_statements(rules):
+    statements, first, parts = [], None, []
+    for num_lines, line in enumerate(rules.splitlines(), 1):
+        line = line.split('#')[0].strip()
+        if not line:
+            continue
+        if first is None:
+            first = num_lines
+        parts.append(line)
+        if line.endswith(';'):
+            statement = ' '.join(parts)
+            if not (statement.startswith('::') or
+                    re.match(r'^\$\w+\s*=', statement)):
+                statements.append((first, num_lines, statement))
+            first, parts = None, []
+    return statements
+
+
+# State of the worker processes in rule_coverage().
+_coverage = {}
+
+
+def _init_coverage(translit_name, rules, graphs, baseline):
+    _coverage.update(translit_name=translit_name, rules=rules.splitlines(),
+                     graphs=graphs, baseline=baseline)
+
+
+def _count_rule_hits(statement):
+    first, last, _ = statement
+    lines = list(_coverage['rules'])
+    lines[first - 1:last] = [''] * (last - first + 1)
+    try:
+        translit = icu.Transliterator.createFromRules(
+            _coverage['translit_name'], '\n'.join(lines),
+            icu.UTransDirection.FORWARD)
+    except icu.ICUError:
+        return None
+    hits = 0
+    for graph, expected in zip(_coverage['graphs'], _coverage['baseline']):
+        if translit.transliterate(graph) != expected:
+            hits += 1
+    return hits
+
+
+def rule_coverage(translit_name, jobs=None):
+    """Finds out which rules make a difference for the test inputs.
+
+    Every rule gets removed in turn, and the test inputs get replayed
+    against the remaining rules. Returns [(line number, rule, hits)],
+    where hits is the number of test inputs whose output changes without
+    the rule, or None if the rules do not compile without it.
+    """
+    rules_path = 'rules/%s.txt' % translit_name
+    rules, _ = read_rules(rules_path)
+    translit = load_transliterator(translit_name, rules_path)
+    graphs = [graph for _, graph, _ in
+              read_testcases('test/%s.txt' % translit_name)
+              if graph is not None]
+    baseline = [translit.transliterate(graph) for graph in graphs]
+    statements = find_rule_statements(rules)
+    num_jobs = min(jobs or multiprocessing.cpu_count(), len(statements))
+    if num_jobs > 1:
+        pool = multiprocessing.Pool(
+            num_jobs, initializer=_init_coverage,
+            initargs=(translit_name, rules, graphs, baseline))
+        hits = pool.map(_count_rule_hits, statements,
+                        chunksize=max(1, len(statements) // (num_jobs * 4)))
+        pool.close()
+        pool.join()
+    else:
+        _init_coverage(translit_name, rules, graphs, baseline)
+        hits = [_count_rule_hits(statement) for statement in statements]
+    return [(first, statement, h)
+            for (first, _, statement), h in zip(statements, hits)]
+
+
+def coverage_errors(translit_name, jobs=None):
+    rules_path = 'rules/%s.txt' % translit_name
+    coverage = rule_coverage(translit_name, jobs=jobs)
+    hot = sorted((c for c in coverage if c[2]), key=lambda c: -c[2])
+    for num_lines, rule, hits in hot:
+        yield '%s:%d: %d hits for "%s"' % (rules_path, num_lines, hits, rule)
+    for num_lines, rule, hits in coverage:
+        if hits == 0:
+            yield '%s:%d: dead rule "%s"' % (rules_path, num_lines, rule)
+        elif hits is None:
+            yield ('%s:%d: rules do not compile without "%s"' %
+                   (rules_path, num_lines, rule))
+
+
+# With jsonl=True, failures get printed as one JSON record per line.
+def regtest(translit_name, graphemes, phonemes, batch_size=None,
+            coverage=False, jsonl=False):
+    failures = regtest_failures(
+        translit_name, graphemes, phonemes, batch_size=batch_size)
+    if jsonl:
+        num_errors = report(json.dumps(f, ensure_ascii=False, sort_keys=True)
+                            for f in failures)
+    else:
+        num_errors = report(format_failure(f) for f in failures)
+    if coverage:
+        report(coverage_errors(translit_name))
+    return num_errors
@@ -1,10 +1,52 @@
 # -*- coding: utf-8 -*-
 
+# Converts the German hyphenation list "wortliste" to CLDR terms files.
+#
+#     $ python convert_terms_de.py ~/src/wortliste/wortliste
+#
+# writes terms-de.xml, terms-de-CH.xml, terms-de-1901.xml and
+# terms-de-CH-1901.xml to the current directory. The list gets read in
+# chunks, which worker processes convert to all four variants at once;
+# the results get written in the order of the input.
+#
+# With --store terms-de.hyph, the hyphenation points of all variants also
+# get written to a compact binary file for lookups at layout time; see
+# hyphenation_store.py.
+#
+# With --shared-base, only terms-de.xml gets written in full. Most words
+# are hyphenated the same way in all variants, so the other variants get
+# written as terms-de-CH.delta.xml and so on, which only hold what is
+# different from terms-de.xml: entries to add as plain <term> elements,
+# and entries to leave out, such as words with 'ß' in Swiss German, as
+# <term type="removed">. A variant consists of the entries of terms-de.xml
+# without the removed ones, plus the added ones.
+#
+# With --profile, the time spent in each phase of the conversion and the
+# hit rate of the segment cache get printed to stderr.
+
 from __future__ import unicode_literals
-import codecs
+import argparse
+import functools
+import io
+import multiprocessing
+import os
 import re
+import sys
+import time
 from xml.sax.saxutils import escape as xmlescape
 
+import hyphenation_store
+
+WORTLISTE_PATH = '/home/sascha/src/wortliste/wortliste'
+
+VARIANTS = ('de', 'de-CH', 'de-1901', 'de-CH-1901')
+
+# Number of lines that get sent to a worker process at once.
+CHUNK_SIZE = 5000
+
+# Number of converted segments to keep in each process; see LRUCache.
+SEGMENT_CACHE_SIZE = 100000
+
 HEADER = """<ldml>
 	<identity>
 		<version number="$Revision$"/>
@@ -13,6 +55,15 @@ HEADER = """<ldml>
 ​	<terms>
 """
 
+DELTA_HEADER = """<ldml>
+	<!-- Differences to terms-de.xml; see convert_terms_de.py. -->
+	<identity>
+		<version number="$Revision$"/>
+		<language type="%s"/>
+	</identity>
+​	<terms>
+"""
+
 FOOTER = """	</terms>\n</ldml>\n"""
 
 TERM = """		<term>
@@ -21,91 +72,467 @@ TERM = """		<term>
 		</term>
 """
 
-def MakeStream(lang):
-    s = codecs.open('terms-%s.xml' % lang, 'w', 'utf-8')
-    s.write(HEADER % xmlescape(lang))
+def StreamPath(lang, delta=False):
+    return 'terms-%s%s.xml' % (lang, '.delta' if delta else '')
+
+def MakeStream(lang, delta=False):
+    path = StreamPath(lang, delta)
+    s = open('%s.%d.tmp' % (path, os.getpid()), 'wb')
+    header = DELTA_HEADER if delta else HEADER
+    s.write((header % xmlescape(lang)).encode('utf-8'))
     return s
 
-RE_BAD_HYPHEN = re.compile(r'([•]+)[◦]+')
-RE_BLACK_DOTS = re.compile(r'([•]+)')
-
-def ConvertHyph(w):
-    w = w.replace('-', '•').replace('.', '◦')
-    w = w.replace('===', '•••••')
-    w = w.replace('==', '••••')
-    w = w.replace('=', '•••').replace('<=', '•••').replace('=>', '•••')
-    w = w.replace('<', '••').replace('>', '••')
-    w = w.replace('/', '|')
-    num_dots = sorted(
-        list(set([1] + [len(x) for x in RE_BLACK_DOTS.findall(w)])))
-    mapping = dict([(num_dots, '•' * (order+1))
-                    for order, num_dots in enumerate(num_dots)])
-    w = RE_BLACK_DOTS.sub(lambda s:mapping[len(s.group(1))], w)
-    w = RE_BAD_HYPHEN.sub(lambda s:'◦' * len(s.group(1)), w)
+def CloseStream(s, lang, delta=False):
+    s.write(FOOTER.encode('utf-8'))
+    s.close()
+    os.rename(s.name, StreamPath(lang, delta))
+
+# Hyphenation markup in wortliste. Breaks get rendered as runs of black
+# dots, ranked by how strong they are: '-' (1 dot) < '<', '>' (2) < '=' (3)
+# < '==' (4) < '===', '<=', '=>' (5). A '.' marks a bad break, which gets
+# rendered in white, '◦'; a break followed by '.' turns white as well.
+RE_MARKUP = re.compile(r'([-.<>=•◦]+)')
+BLACK_DOTS = {'-': 1, '•': 1, '<': 2, '>': 2}
+WHITE_DOTS = ('.', '◦')
+EQUALS_DOTS = (0, 3, 4)  # for 0, 1, 2 trailing '=' after each '==='
+
+_markup_runs = {}
+
+def MarkupRuns(markup):
+    """'=.-' --> (3, -1, 1); black dots positive, white ones negative."""
+    runs = _markup_runs.get(markup)
+    if runs is not None:
+        return runs
+    runs, equals = [], 0
+    for c in markup + ' ':
+        if c == '=':
+            equals += 1
+            continue
+        dots = BLACK_DOTS.get(c, 0)
+        if equals:
+            dots += 5 * (equals // 3) + EQUALS_DOTS[equals % 3]
+            equals = 0
+        if dots:
+            if runs and runs[-1] > 0:
+                runs[-1] += dots
+            else:
+                runs.append(dots)
+        if c in WHITE_DOTS:
+            if runs and runs[-1] < 0:
+                runs[-1] -= 1
+            else:
+                runs.append(-1)
+    runs = _markup_runs[markup] = tuple(runs)
+    return runs
+
+def RankWeights(runs, ranks):
+    """(3, -1, 1) --> [-2, 1] if a run of 3 black dots has rank 2.
+
+    Black runs get replaced by their rank; a black run followed by white
+    dots is a bad break, and turns into as many white dots as its rank.
+    """
+    weights = []
+    for run in runs:
+        if run > 0:
+            weights.append(ranks[run])
+            continue
+        if weights and weights[-1] > 0:
+            run = -weights.pop()
+        if weights and weights[-1] < 0:
+            weights[-1] += run
+        else:
+            weights.append(run)
+    return weights
+
+# Because of the ranking, the weights of a word's breaks depend on all
+# of its markup. They get memoized per sequence of markup runs, such as
+# ('-', '=', '-'); the memo gets cleared when it grows beyond this size.
+MAX_MEMO_SIZE = 100000
+_weights_memo = {}
+
+def MarkupWeights(markups):
+    """('=', '.-') --> (None, ((2,), (-1, 1)))
+
+    Returns the weights of the breaks for each run of markup, and if
+    each run has a single break, these weights as one flat tuple with
+    a final 0, such as (2, 1, 0) for ('=', '-').
+    """
+    weights = _weights_memo.get(markups)
+    if weights is not None:
+        return weights
+    runs = [MarkupRuns(markup) for markup in markups]
+    lengths = set([1])
+    for r in runs:
+        lengths.update(n for n in r if n > 0)
+    ranks = dict((n, rank + 1) for rank, n in enumerate(sorted(lengths)))
+    weights = tuple(tuple(RankWeights(r, ranks)) for r in runs)
+    flat = None
+    if all(len(w) == 1 for w in weights):
+        flat = tuple(w[0] for w in weights) + (0,)
+    if len(_weights_memo) >= MAX_MEMO_SIZE:
+        _weights_memo.clear()
+    weights = _weights_memo[markups] = (flat, weights)
+    return weights
+
+def ParseHyph(w):
+    """Parses wortliste markup into one token tuple per alternative.
+
+    'Blut=zu{ck/k.k}er' --> [(('Blut', 2), ('zu{ck|k', -1), ('k}er', 0))]
+
+    Each token is a segment of text with the weight of the break that
+    follows it: n > 0 for n black dots, n < 0 for -n white dots, 0 for
+    none. 'Ka[s-s/ss]e' gives two alternatives, 'Kas•se' and 'Kasse'.
+    """
+    parts = RE_MARKUP.split(w.replace('/', '|'))
+    flat, weights = MarkupWeights(tuple(parts[1::2]))
+    if flat is not None:
+        tokens = tuple(zip(parts[::2], flat))
+    else:
+        tokens = []
+        for segment, segment_weights in zip(parts[::2], weights):
+            for weight in segment_weights:
+                tokens.append((segment, weight))
+                segment = ''
+        tokens.append((parts[-1], 0))
+        tokens = tuple(tokens)
     if '[' in w:
-        #print(w.encode('utf-8'))
-        assert w.count('[') == 1
-        assert w.count(']') == 1
-        assert w.count('|') <= 2
-        prefix, rest = w.split('[', 1)
-        infix1, rest = rest.split('|', 1)
-        infix2, suffix = rest.split(']', 1)
-        return [prefix + infix1 + suffix, prefix + infix2 + suffix]
-    return [w]
+        return SplitAlternatives(w, tokens)
+    return [tokens]
+
+# Delimiters for the parts of 'prefix[infix1|infix2]suffix'.
+ALTERNATIVE_DELIMITERS = '[|]'
+
+def SplitAlternatives(w, tokens):
+    assert w.count('[') == 1
+    assert w.count(']') == 1
+    assert w.count('/') + w.count('|') <= 2
+    alternatives, pending = ([], []), ['', '']
+    part = 0  # prefix, infix1, infix2, suffix
+    targets = ((0, 1), (0,), (1,), (0, 1))
+    for segment, weight in tokens:
+        while part < 3:
+            pos = segment.find(ALTERNATIVE_DELIMITERS[part])
+            if pos < 0:
+                break
+            for t in targets[part]:
+                pending[t] += segment[:pos]
+            segment = segment[pos + 1:]
+            part += 1
+        for t in targets[part]:
+            pending[t] += segment
+            if weight:
+                alternatives[t].append((pending[t], weight))
+                pending[t] = ''
+    if part != 3:
+        raise ValueError(w)
+    return [tuple(alt) + ((pending[t], 0),)
+            for t, alt in enumerate(alternatives)]
+
+def RenderHyph(tokens):
+    """Renders parsed hyphenation in CLDR syntax, 'Blut••zu{ck|k◦k}er'."""
+    return ''.join([segment + ('•' * weight if weight > 0 else '◦' * -weight)
+                    for segment, weight in tokens])
 
 RE_COMPLEX_HYPHEN = re.compile(r'{[^}]*}')
 
-def MakeTerm(hyph):
-    term = hyph.replace('•', '').replace('◦', '')
-    return RE_COMPLEX_HYPHEN.sub(lambda s:s.group(0).split('|')[0][1:], term)
-
-def Convert():
-    de = MakeStream('de')
-    de_CH = MakeStream('de-CH')
-    de_1901 = MakeStream('de-1901')
-    de_CH_1901 = MakeStream('de-CH-1901')
-    for line in codecs.open('/home/sascha/src/wortliste/wortliste', 'r',
-                            'utf-8'):
-        line = line.split('#')[0].strip()
-        cols = (line.split(';') + [None] * 8)[:8]
-        hyph = cols[1]
-        hyph_de = hyph_de_CH = hyph_de_1901 = hyph_de_CH_1901 = []
-        if hyph and hyph != '-2-':
-            hyph_de = hyph_de_CH = hyph_de_1901 = hyph_de_CH_1901 = \
-                      ConvertHyph(hyph)
+def MakeTerm(tokens):
+    """The term for parsed hyphenation, 'Blutzucker'."""
+    term = ''.join([segment for segment, _ in tokens])
+    if '{' in term:
+        term = RE_COMPLEX_HYPHEN.sub(
+            lambda s:s.group(0).split('|')[0][1:], term)
+    return term
+
+def BreakMask(tokens):
+    """Bitmask of the good breaks in the term, see hyphenation_store.py.
+
+    Breaks inside the second alternative of '{ck|k•k}' get placed at the
+    same offset in the first one, 'zuc•ker'.
+    """
+    mask = pos = 0
+    part = 0  # outside braces, first alternative, second alternative
+    for segment, weight in tokens:
+        if part or '{' in segment:
+            for c in segment:
+                if c == '{' and not part:
+                    part, start = 1, pos
+                elif c == '|' and part == 1:
+                    part, offset = 2, 0
+                elif c == '}' and part:
+                    part = 0
+                elif part == 2:
+                    offset += 1
+                else:
+                    pos += 1
         else:
-            if cols[2] and cols[2] != '-3-':
-                hyph_de_1901 = ConvertHyph(cols[2])
-            if cols[3] and cols[3] != '-4-':
-                hyph_de = ConvertHyph(cols[3])
-            if cols[4] and cols[4] != '-5-':
-                hyph_de_CH = hyph_de_CH_1901 = ConvertHyph(cols[4])
-            else:
-                hyph_de_CH = hyph_de
-                hyph_de_CH_1901 = hyph_de_1901
-            if cols[5] and cols[5] != '-6-':
-                hyph_de_CH_1901 = ConvertHyph(cols[5])
-            if cols[6] and cols[6] != '-7-':
-                hyph_de_CH = ConvertHyph(cols[6])
-            if cols[7] and cols[7] != '-8-':
-                hyph_de_CH_1901 = ConvertHyph(cols[7])
-        for h in hyph_de:
-            de.write(TERM % (xmlescape(MakeTerm(h)), xmlescape(h)))
-        for h in hyph_de_CH:
-            if 'ß' not in h:
-                de_CH.write(TERM % (xmlescape(MakeTerm(h)), xmlescape(h)))
-        for h in hyph_de_1901:
-            de_1901.write(TERM % (xmlescape(MakeTerm(h)), xmlescape(h)))
-        for h in hyph_de_CH_1901:
-            if 'ß' not in h:
-                de_CH_1901.write(TERM % (xmlescape(MakeTerm(h)), xmlescape(h)))
-
-    for s in (de, de_CH, de_1901, de_CH_1901):
-        s.write(FOOTER)
-        s.close()
+            pos += len(segment)
+        if weight > 0:
+            mask |= 1 << (min(start + offset, pos) if part == 2 else pos)
+    return mask & ((1 << pos) - 2) if pos else 0
+
+def SplitLine(line):
+    """Returns the markup of a line for each of VARIANTS, or None."""
+    line = line.split('#')[0].strip()
+    cols = (line.split(';') + [None] * 8)[:8]
+    hyph = cols[1]
+    hyph_de = hyph_de_CH = hyph_de_1901 = hyph_de_CH_1901 = None
+    if hyph and hyph != '-2-':
+        hyph_de = hyph_de_CH = hyph_de_1901 = hyph_de_CH_1901 = hyph
+    else:
+        if cols[2] and cols[2] != '-3-':
+            hyph_de_1901 = cols[2]
+        if cols[3] and cols[3] != '-4-':
+            hyph_de = cols[3]
+        if cols[4] and cols[4] != '-5-':
+            hyph_de_CH = hyph_de_CH_1901 = cols[4]
+        else:
+            hyph_de_CH = hyph_de
+            hyph_de_CH_1901 = hyph_de_1901
+        if cols[5] and cols[5] != '-6-':
+            hyph_de_CH_1901 = cols[5]
+        if cols[6] and cols[6] != '-7-':
+            hyph_de_CH = cols[6]
+        if cols[7] and cols[7] != '-8-':
+            hyph_de_CH_1901 = cols[7]
+    return hyph_de, hyph_de_CH, hyph_de_1901, hyph_de_CH_1901
+
+class LRUCache(object):
+    """Keeps at least the maxsize most recently used entries.
+
+    The entries live in two generations of dicts; when the recent one is
+    full, it replaces the old one, and entries found in the old one move
+    back to the recent one. This keeps the bookkeeping in dict lookups,
+    which an OrderedDict cannot do in Python 2, at the price of holding
+    up to twice maxsize entries.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._recent, self._old = {}, {}
+
+    def get(self, key, default=None):
+        value = self._recent.get(key)
+        if value is None:
+            value = self._old.get(key)
+            if value is None:
+                self.misses += 1
+                return default
+            self.put(key, value)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if len(self._recent) >= self.maxsize:
+            self._old, self._recent = self._recent, {}
+        self._recent[key] = value
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+# {(segment, weight): (segment, escaped segment, escaped rendering)}
+# Every word of wortliste is different, but the stems and syllables of
+# compounds repeat all the time.
+_segment_cache = LRUCache(SEGMENT_CACHE_SIZE)
+
+class PhaseTimer(object):
+    """Adds up the seconds spent in each phase of the conversion."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.last = time.time()
+
+    def mark(self, phase):
+        """Charges the time since the previous mark to phase."""
+        now = time.time()
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + now - self.last
+        self.last = now
+
+# Appends the difference between the <term> elements of a line in the
+# base variant and in another one to out, as in --shared-base.
+def AppendDelta(out, base, terms):
+    added = list(terms)
+    for term in base:
+        if term in added:
+            added.remove(term)
+        else:
+            out.append(term.replace('<term>', '<term type="removed">', 1))
+    out.extend(added)
+
+def ConvertSegment(token):
+    """(segment, weight) --> (segment, escaped segment, escaped rendering)"""
+    converted = _segment_cache.get(token)
+    if converted is None:
+        segment = token[0]
+        converted = (segment, xmlescape(segment),
+                     xmlescape(RenderHyph([token])))
+        _segment_cache.put(token, converted)
+    return converted
+
+def MakeTermElement(tokens, segments, store):
+    """('ß' in hyph, <term> element, term, BreakMask or None)
+
+    segments holds the converted segments of the current chunk, so each
+    of them only gets looked up in the (pure Python) cache once.
+    """
+    converted = [segments.get(token) for token in tokens]
+    if None in converted:
+        for token in tokens:
+            if token not in segments:
+                segments[token] = ConvertSegment(token)
+        converted = [segments[token] for token in tokens]
+    t = ''.join([c[0] for c in converted])
+    eszett = 'ß' in t
+    if '{' in t:
+        t = MakeTerm(tokens)
+        escaped_term = xmlescape(t)
+    else:
+        escaped_term = ''.join([c[1] for c in converted])
+    element = TERM % (escaped_term, ''.join([c[2] for c in converted]))
+    return eszett, element, t, BreakMask(tokens) if store else None
+
+def ConvertChunk(lines, store=False, delta=False, profile=False):
+    """Returns the encoded <term> elements for each of VARIANTS.
+
+    With store, also returns [(term, variant index, BreakMask)]. With
+    delta, the variants after the first only get the differences to it.
+    With profile, also returns {phase or counter: value} for the chunk.
+    """
+    outputs = tuple([] for _ in VARIANTS)
+    entries = []
+    segments = {}
+    cache = _segment_cache
+    hits, misses = cache.hits, cache.misses
+    if profile:
+        timer = PhaseTimer()
+    for line in lines:
+        terms = {}  # most variants share their markup
+        base = None
+        for i, lang, out, w in zip(range(len(VARIANTS)), VARIANTS,
+                                   outputs, SplitLine(line)):
+            swiss = lang.startswith('de-CH')
+            elements = [] if delta else out
+            line_terms = terms.get(w) if w else ()
+            if line_terms is None:
+                parsed = ParseHyph(w)
+                if profile:
+                    timer.mark('parse')
+                line_terms = terms[w] = [
+                    MakeTermElement(tokens, segments, store)
+                    for tokens in parsed]
+                if profile:
+                    timer.mark('convert')
+            for term in line_terms:
+                if not (swiss and term[0]):
+                    elements.append(term[1])
+                    if store:
+                        entries.append((term[2], i, term[3]))
+            if not delta:
+                continue
+            if base is None:
+                base = elements
+                out.extend(elements)
+            elif elements != base:
+                AppendDelta(out, base, elements)
+        if profile:
+            timer.mark('convert')
+    outputs = [''.join(out).encode('utf-8') for out in outputs]
+    if not profile:
+        return outputs, entries, None
+    timer.mark('escape')
+    stats = timer.seconds
+    stats['cache hits'] = cache.hits - hits
+    stats['cache misses'] = cache.misses - misses
+    return outputs, entries, stats
+
+def ReadChunks(path, size):
+    with io.open(path, 'r', encoding='utf-8') as f:
+        chunk = []
+        for line in f:
+            chunk.append(line)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def PrintProfile(stats, seconds, store):
+    """Prints the summed stats of all chunks to stderr.
+
+    Segments get escaped once, when they are first converted, so escape
+    is mostly the time for encoding the output.
+    """
+    out = sys.stderr
+    out.write('phase      seconds\n')
+    phases = ['parse', 'convert', 'escape', 'write'] + (['store'] * store)
+    for phase in phases:
+        out.write('%-10s %7.2f\n' % (phase, stats.get(phase, 0.0)))
+    out.write('%-10s %7.2f\n' % ('wall', seconds))
+    hits, misses = stats.get('cache hits', 0), stats.get('cache misses', 0)
+    out.write('segment cache: %d hits, %d misses, %.1f%% hit rate\n' % (
+        hits, misses, 100.0 * hits / (hits + misses) if hits else 0.0))
+
+def Convert(path=WORTLISTE_PATH, jobs=None, store_path=None,
+            shared_base=False, profile=False):
+    """Converts wortliste at path to terms files in the current directory.
+
+    With profile, prints the time spent in each phase to stderr; with
+    worker processes, parse, convert and escape add up their times.
+    """
+    start = time.time()
+    timer = PhaseTimer()
+    deltas = [shared_base and i > 0 for i in range(len(VARIANTS))]
+    streams = [MakeStream(lang, delta)
+               for lang, delta in zip(VARIANTS, deltas)]
+    chunks = ReadChunks(path, CHUNK_SIZE)
+    convert = functools.partial(ConvertChunk, store=bool(store_path),
+                                delta=shared_base, profile=profile)
+    if jobs == 1:
+        pool, results = None, (convert(chunk) for chunk in chunks)
+    else:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap(convert, chunks)
+    store_terms = {}  # {term: [BreakMask or None for each variant]}
+    for outputs, entries, stats in results:
+        timer.mark('wait')  # overlaps with the phases of ConvertChunk
+        for key, value in (stats or {}).items():
+            timer.seconds[key] = timer.seconds.get(key, 0) + value
+        for s, data in zip(streams, outputs):
+            s.write(data)
+        timer.mark('write')
+        for term, i, mask in entries:
+            masks = store_terms.setdefault(term, [None] * len(VARIANTS))
+            masks[i] = mask if masks[i] is None else masks[i] & mask
+        timer.mark('store')
+    if pool is not None:
+        pool.close()
+        pool.join()
+    for s, lang, delta in zip(streams, VARIANTS, deltas):
+        CloseStream(s, lang, delta)
+    timer.mark('write')
+    if store_path:
+        hyphenation_store.write_store(store_path, VARIANTS, store_terms)
+        timer.mark('store')
+    if profile:
+        PrintProfile(timer.seconds, time.time() - start, bool(store_path))
 
 if __name__ == '__main__':
-    Convert()
+    parser = argparse.ArgumentParser(
+        description='Converts wortliste to CLDR terms files.')
+    parser.add_argument('wortliste', nargs='?', default=WORTLISTE_PATH,
+                        help='path to wortliste, default: %(default)s')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('--store', metavar='PATH',
+                        help='also write a binary hyphenation store')
+    parser.add_argument('--shared-base', action='store_true',
+                        help='write the variants other than de as '
+                             'differences to terms-de.xml')
+    parser.add_argument('--profile', action='store_true',
+                        help='print the time spent in each phase')
+    args = parser.parse_args()
+    Convert(args.wortliste, args.jobs, args.store, args.shared_base,
+            args.profile)
     #print MakeTerm('Blut•zu{ck|k◦k}er•spie◦gel')
     #<hyph loc="de-1901">Blut•zu{ck/k◦k}er•spie◦gel</hyph>
-    
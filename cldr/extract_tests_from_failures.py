@@ -1,8 +1,123 @@
-import re, unicodedata
-
-for line in open('x'):
-    if 'Expected "TODO" but got' not in line: continue
-    line = unicodedata.normalize('NFC', line.strip().decode('utf-8'))
-    line = line.encode('utf-8')
-    got, orig = re.match(r'.*got "(.+?)" for "(.+?)"', line.strip()).groups()
-    print '\t'.join([orig, got])
+# -*- coding: utf-8 -*-
+
+# Turns the current output of our rules into test cases.
+#
+# To bootstrap tests for a word list, add the words to test/xx.txt
+# with "TODO" as expected transliteration, check the rules' output,
+# and let this tool fill it in:
+#
+#     $ python extract_tests_from_failures.py am
+#
+# The tool reads the failure records of the regression test, either by
+# running the test itself, or from JSONL records produced earlier by
+# cldr_util.regtest(..., jsonl=True):
+#
+#     $ python extract_tests_from_failures.py --records failures.jsonl
+#
+# For every "TODO" that failed, the actual transliteration becomes the
+# new expectation. The new entries get merged into the test file in
+# sorted order; inputs that the file already covers are skipped.
+
+from __future__ import unicode_literals
+import argparse
+import codecs
+import json
+import os
+import sys
+import unicodedata
+
+import cldr_util
+from run_translit_tests import find_suites, get_inventory, get_language
+
+
+def read_records(path):
+    f = sys.stdin if path == '-' else open(path, 'rb')
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def run_regtests(suites):
+    for translit_name in suites:
+        graphemes, phonemes = get_inventory(translit_name)
+        for failure in cldr_util.regtest_failures(
+                translit_name, graphemes, phonemes):
+            yield failure
+
+
+# Returns {test path: {input: transliteration}} for all failed TODOs.
+def collect_entries(failures):
+    entries = {}
+    for failure in failures:
+        if failure['type'] == 'mismatch' and failure['expected'] == 'TODO':
+            graph = unicodedata.normalize('NFC', failure['input'])
+            actual = unicodedata.normalize('NFC', failure['actual'])
+            entries.setdefault(failure['path'], {})[graph] = actual
+    return entries
+
+
+def read_covered_inputs(test_path):
+    covered = set()
+    for _, graph, expected in cldr_util.read_testcases(test_path):
+        if graph is not None and expected != 'TODO':
+            covered.add(graph)
+    return covered
+
+
+# Copies the test file line by line, dropping the TODOs we have answers
+# for and inserting each new entry in front of the first existing entry
+# that sorts after it. In a sorted file, the result is sorted as well.
+def merge_entries(test_path, entries):
+    covered = read_covered_inputs(test_path)
+    new_entries = sorted((graph, ipa) for graph, ipa in entries.items()
+                         if graph not in covered)
+    pending = iter(new_entries)
+    entry = next(pending, None)
+    tmp_path = '%s.%d.tmp' % (test_path, os.getpid())
+    with codecs.open(tmp_path, 'w', 'utf-8') as out:
+        for line in codecs.open(test_path, 'r', 'utf-8'):
+            if not line.strip() or line.startswith('#'):
+                out.write(line)
+                continue
+            fields = line.rstrip('\n').split('\t')
+            graph = fields[0]
+            while entry is not None and entry[0] < graph:
+                out.write('%s\t%s\n' % entry)
+                entry = next(pending, None)
+            if len(fields) == 2 and fields[1] == 'TODO' and graph in entries:
+                continue
+            out.write(line)
+        while entry is not None:
+            out.write('%s\t%s\n' % entry)
+            entry = next(pending, None)
+    os.rename(tmp_path, test_path)
+    return len(new_entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Fills in TODOs in the transliteration tests.')
+    parser.add_argument('languages', nargs='*',
+                        help='run the tests for these, such as "am"')
+    parser.add_argument('--records', metavar='FILE',
+                        help='read JSONL failure records, "-" for stdin')
+    args = parser.parse_args()
+    records_path = args.records
+    if records_path and records_path != '-':
+        records_path = os.path.abspath(records_path)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if records_path:
+        failures = read_records(records_path)
+    else:
+        suites = [s for s in find_suites()
+                  if not args.languages or get_language(s) in args.languages]
+        failures = run_regtests(suites)
+    for test_path, entries in sorted(collect_entries(failures).items()):
+        num_added = merge_entries(test_path, entries)
+        print('%s: %d new test cases' % (test_path, num_added))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,14 +5,19 @@
 # See http://unicode.org/cldr/trac/ticket/9497 for background.
 
 from __future__ import unicode_literals
+import argparse
 import codecs
 import icu
+import json
+import multiprocessing
 import os
 import re
 import unicodedata
 import xml.etree.ElementTree as etree
 from xml.sax.saxutils import escape as xmlescape
 
+import cldr_util
+
 # Run "svn co svn+ssh://unicode.org/repos/cldr/trunk" to download.
 CLDR_SOURCE = '~/src/cldr2/trunk'
 
@@ -56,6 +61,20 @@ def read_likely_subtags():
             for t in ldml.iterfind('./likelySubtags/likelySubtag')}
 
 
+def read_parent_locales():
+    filepath = os.path.expanduser(
+        os.path.join(CLDR_SOURCE, 'common/supplemental/supplementalData.xml'))
+    ldml = etree.parse(filepath).getroot()
+    result = {}
+    for parents in ldml.iterfind('./parentLocales'):
+        if 'component' in parents.attrib:  # eg. only for collation
+            continue
+        for p in parents.iterfind('./parentLocale'):
+            for locale in p.attrib['locales'].split():
+                result[locale] = p.attrib['parent']
+    return result
+
+
 def read_language_aliases():
     filepath = os.path.expanduser(
         os.path.join(CLDR_SOURCE,
@@ -65,16 +84,40 @@ def read_language_aliases():
             for t in ldml.iterfind('./metadata/alias/languageAlias')}
 
 
+# Key for the on-disk caches; files with another key need to be re-read.
+def file_stamp(path):
+    stat = os.stat(path)
+    return [repr(stat.st_mtime), stat.st_size]
+
+
 def read_fontconfig_exemplars():
-    """Returns exemplar chars according to fontconfig."""
+    """Returns exemplar chars according to fontconfig.
+
+    The parsed sets are cached on disk, together with the stamps of
+    each orth file and of all the files it includes.
+    """
     result = {}
+    cache = cldr_util.read_cache('fontconfig-orth.json', {})
+    changed = False
     path = os.path.expanduser(os.path.join(FONTCONFIG_SOURCE, 'fc-lang'))
     for filename in os.listdir(path):
         if not filename.endswith('.orth'):
             continue
         locale = icu.Locale.createFromName(filename[:-len('.orth')])
-        chars = read_fontconfig_orth(os.path.join(path, filename))
-        result[locale.getName()] = chars
+        filepath = os.path.join(path, filename)
+        entry = cache.get(filepath)
+        if entry is None or any(
+                not os.path.exists(f) or file_stamp(f) != stamp
+                for f, stamp in entry['files'].items()):
+            chars, references, files = _read_fontconfig_orth(filepath)
+            entry = cache[filepath] = {
+                'chars': chars.toPattern(True), 'references': references,
+                'files': files}
+            changed = True
+        result[locale.getName()] = (
+            icu.UnicodeSet(entry['chars']), entry['references'])
+    if changed:
+        cldr_util.write_cache('fontconfig-orth.json', cache)
     return result
 
 
@@ -90,13 +133,43 @@ def normalize_fontconfig_char(c):
     return unicodedata.normalize('NFC', c.lower())
 
 
+# The characters for which normalize_fontconfig_char() may return
+# something else. All other characters can be added to sets in bulk.
+UNSTABLE_FONTCONFIG_CHARS = icu.UnicodeSet(
+    '[[:Changes_When_Lowercased:][:NFC_Quick_Check=No:]]')
+UNSTABLE_FONTCONFIG_CHARS.freeze()
+
+
+def add_fontconfig_range(uset, start, end):
+    chars = icu.UnicodeSet(unichr(start), unichr(end))
+    unstable = icu.UnicodeSet(chars)
+    unstable.retainAll(UNSTABLE_FONTCONFIG_CHARS)
+    chars.removeAll(UNSTABLE_FONTCONFIG_CHARS)
+    uset.addAll(chars)
+    for c in unstable:
+        uset.add(normalize_fontconfig_char(c))
+
+
 def read_fontconfig_orth(path):
     """filepath to fontconfig *.orth file --> (icu.UnicodeSet, [references])"""
+    chars, references, _ = _read_fontconfig_orth(path)
+    return (chars, references)
+
+
+# Many orth files include the same files, which we parse only once.
+_fontconfig_orths = {}  # path --> (icu.UnicodeSet, [references], {path: stamp})
+
+
+def _read_fontconfig_orth(path):
+    path = os.path.normpath(path)
+    if path in _fontconfig_orths:
+        return _fontconfig_orths[path]
     result = icu.UnicodeSet()
     references = [
         'https://cgit.freedesktop.org/fontconfig/tree/fc-lang/' +
         os.path.basename(path)
     ]
+    files = {path: file_stamp(path)}
     with codecs.open(path, 'r', 'utf-8') as f:
         for line in f:
             references.extend(extract_urls(line))
@@ -105,28 +178,67 @@ def read_fontconfig_orth(path):
                 continue
             elif line.startswith('include '):
                 incfile = os.path.join(os.path.dirname(path), line.split()[1])
-                result.addAll(read_fontconfig_orth(incfile)[0])
+                incchars, _, incfiles = _read_fontconfig_orth(incfile)
+                result.addAll(incchars)
+                files.update(incfiles)
             else:
                 r = [int(x, 16) for x in line.split('-') if x.strip()]
                 if len(r) == 1:
                     result.add(normalize_fontconfig_char(unichr(r[0])))
                 elif len(r) == 2:
-                    for c in range(r[0], r[1] + 1):
-                        result.add(normalize_fontconfig_char(unichr(c)))
+                    add_fontconfig_range(result, r[0], r[1])
                 else:
                     raise ValueError(path)
     result = result.compact()
-    return (result, references)
+    _fontconfig_orths[path] = (result, references, files)
+    return _fontconfig_orths[path]
 
 
-def read_cldr_exemplars():
-    result = {}
+def read_cldr_exemplars(jobs=None):
+    """Returns {lang: ({type: icu.UnicodeSet}, source)} for CLDR.
+
+    What we found in each file is kept in an index keyed by the file's
+    path, modification time and size, so a re-run only needs to parse
+    the files that have changed since the last run.
+    """
+    index = cldr_util.read_cache('cldr-exemplars.json', {})
+    files, todo = [], {}
     for directory in ('seed', 'exemplars', 'common'):
         path = os.path.expanduser(os.path.join(CLDR_SOURCE, directory, 'main'))
-        for filename in os.listdir(path):
+        for filename in sorted(os.listdir(path)):
             if filename.endswith('.xml'):
-                lang, exemplars = read_cldr_file(os.path.join(path, filename))
-                result[lang] = (exemplars, '%s/main/%s' % (directory, filename))
+                filepath = os.path.join(path, filename)
+                key = file_stamp(filepath)
+                files.append((directory, filename, filepath))
+                if index.get(filepath, {}).get('key') != key:
+                    todo[filepath] = key
+    paths = sorted(todo)
+    # Worker processes only pay off for more than one chunk of files.
+    chunksize = 16
+    num_jobs = min(jobs or multiprocessing.cpu_count(),
+                   len(paths) // chunksize)
+    if num_jobs > 1:
+        pool = multiprocessing.Pool(num_jobs)
+        parsed = pool.imap(parse_cldr_file, paths, chunksize=chunksize)
+    else:
+        pool, parsed = None, (parse_cldr_file(p) for p in paths)
+    for filepath, (lang, patterns) in zip(paths, parsed):
+        index[filepath] = {
+            'key': todo[filepath], 'lang': lang, 'exemplars': patterns}
+    if pool is not None:
+        pool.close()
+        pool.join()
+    num_entries = len(index)
+    index = {filepath: index[filepath] for _, _, filepath in files}
+    if todo or len(index) != num_entries:
+        cldr_util.write_cache('cldr-exemplars.json', index)
+    result = {}
+    for directory, filename, filepath in files:
+        entry = index[filepath]
+        exemplars = {extype: icu.UnicodeSet(pattern)
+                     for extype, pattern in entry['exemplars'].items()}
+        result[entry['lang']] = (
+            exemplars, '%s/main/%s' % (directory, filename))
     return result
 
 
@@ -153,28 +265,52 @@ def guess_script(s):
 
 
 def read_cldr_file(filepath):
+    lang, patterns = parse_cldr_file(filepath)
+    return lang, {extype: icu.UnicodeSet(pattern)
+                  for extype, pattern in patterns.items()}
+
+
+# Top-level LDML elements that may come before <characters>.
+LDML_BEFORE_CHARACTERS = {
+    'identity', 'alias', 'fallback', 'localeDisplayNames', 'layout',
+    'contextTransforms', 'characters',
+}
+
+
+def parse_cldr_file(filepath):
+    """filepath to LDML file --> (lang, {exemplar type: pattern})
+
+    Only reads the file up to its <characters> element.
+    """
     assert filepath.endswith('.xml'), filepath
-    exemplars = {}
-    ldml = etree.parse(filepath).getroot()
-    lang = ldml.find('./identity/language').attrib['type']
-    script = ldml.find('./identity/script')
-    if script is not None:
-        lang = lang + '_' + script.attrib['type']
-    territory = ldml.find('./identity/territory')
-    if territory is not None:
-        lang = lang + '_' + territory.attrib['type']
-    variants = sorted([t.attrib['type']
-                       for t in ldml.iterfind('./identity/variant')])
-    if variants is not None:
-        lang = '_'.join([lang] + variants)
-    tags = set(t.tag for t in ldml.iterfind('./identity/*'))
-    if not tags.issubset({
+    identity, patterns, path = {}, {}, []
+    for event, elem in etree.iterparse(filepath, events=('start', 'end')):
+        if event == 'start':
+            if path == ['ldml'] and elem.tag not in LDML_BEFORE_CHARACTERS:
+                break
+            path.append(elem.tag)
+            continue
+        path.pop()
+        if path == ['ldml', 'identity']:
+            identity.setdefault(elem.tag, []).append(elem.attrib.get('type'))
+        elif path == ['ldml', 'characters']:
+            if elem.tag == 'exemplarCharacters':
+                extype = elem.attrib.get('type', 'main')
+                patterns[extype] = ''.join(elem.itertext())
+        elif path == ['ldml']:
+            if elem.tag == 'characters':
+                break
+            elem.clear()
+    lang = identity['language'][0]
+    if 'script' in identity:
+        lang = lang + '_' + identity['script'][0]
+    if 'territory' in identity:
+        lang = lang + '_' + identity['territory'][0]
+    lang = '_'.join([lang] + sorted(identity.get('variant', [])))
+    if not set(identity).issubset({
             'version', 'language', 'script', 'territory', 'variant'}):
         raise ValueError('unexpected identity elements in %s' % filepath)
-    for ex in ldml.iterfind('./characters/exemplarCharacters'):
-        extype = ex.attrib.get('type', 'main')
-        exemplars[extype] = icu.UnicodeSet(''.join(ex.itertext()))
-    return lang, exemplars
+    return lang, patterns
 
 
 # Whitelist of language tags that we accept as valid, even if CLDR
@@ -205,30 +341,67 @@ NEEDS_MANUAL_CLEANUP = {
     'shs_Latn',  # Shuswap
 }
 
-def get_cldr_exemplars_by_type(lang, key, exemplars):
-    subtags = lang.split('_')
-    for i in range(len(subtags), 0, -1):
-        result, source = exemplars.get('_'.join(subtags[:i]), (None, None))
-        if result and key in result:
-            return result[key], source
-    return None, None
-
-
-def get_cldr_exemplars(lang, exemplars):
-    main, src = get_cldr_exemplars_by_type(lang, 'main', cldr_exemplars)
-    if not main:
-        return None, set()
-    result = icu.UnicodeSet(main)
-    sources = {src}
-    aux, src = get_cldr_exemplars_by_type(lang, 'auxiliary', cldr_exemplars)
-    if aux:
-        result.addAll(aux)
-        sources.add(src)
-    index, src = get_cldr_exemplars_by_type(lang, 'index', cldr_exemplars)
-    if index:
-        result.addAll(index)
-        sources.add(src)
-    return result, sources
+class LocaleResolver(object):
+    """Looks up CLDR exemplars along the inheritance chain of a locale.
+
+    A locale inherits from its explicit parent in CLDR's parentLocales,
+    or else from the locale with its last subtag removed. Removing the
+    script subtag leads to root if the language has a different likely
+    script. Chains and merged exemplar sets are cached.
+    """
+
+    def __init__(self, exemplars, parent_locales, likely_subtags):
+        self.exemplars = exemplars
+        self.parent_locales = parent_locales
+        self.likely_subtags = likely_subtags
+        self.chains = {}  # locale --> [locale, parent, grandparent, ...]
+        self.merged = {}  # locale --> (icu.UnicodeSet, {source})
+
+    def get_parent(self, locale):
+        if locale in self.parent_locales:
+            return self.parent_locales[locale]
+        subtags = locale.split('_')
+        if len(subtags) == 1:
+            return 'root'
+        parent = '_'.join(subtags[:-1])
+        script = subtags[-1]
+        if len(subtags) == 2 and len(script) == 4:
+            likely = self.likely_subtags.get(parent, '').split('_')
+            if len(likely) > 1 and likely[1] != script:
+                return 'root'
+        return parent
+
+    def get_chain(self, locale):
+        chain = self.chains.get(locale)
+        if chain is None:
+            chain = [] if locale == 'root' else (
+                [locale] + self.get_chain(self.get_parent(locale)))
+            self.chains[locale] = chain
+        return chain
+
+    def get_exemplars(self, locale):
+        """'ab_Cyrl' --> (main + auxiliary + index exemplars, {sources})
+
+        Returns (None, set()) if no locale in the chain has main exemplars.
+        """
+        if locale in self.merged:
+            return self.merged[locale]
+        found = {}  # exemplar type --> (icu.UnicodeSet, source)
+        for ancestor in self.get_chain(locale):
+            exemplars, source = self.exemplars.get(ancestor, ({}, None))
+            for extype in ('main', 'auxiliary', 'index'):
+                if extype not in found and extype in exemplars:
+                    found[extype] = (exemplars[extype], source)
+        if not found.get('main', (None, None))[0]:
+            result = (None, set())
+        else:
+            chars = icu.UnicodeSet()
+            for extype_chars, _ in found.values():
+                chars.addAll(extype_chars)
+            chars.freeze()
+            result = (chars, {source for _, source in found.values()})
+        self.merged[locale] = result
+        return result
 
 
 def get_reference_description(url):
@@ -251,38 +424,125 @@ def get_reference_description(url):
     return '[missing]'
 
 
+# Characters that have a special meaning in UnicodeSet patterns,
+# and Pattern_White_Space, which would get ignored.
+UNICODESET_SPECIAL_CHARS = (
+    '[]{}\\-^&$:' '\t\n\x0b\x0c\r \x85\u200e\u200f\u2028\u2029')
+
+
 def escape_for_unicodeset(char):
-    if char in '[]{}\\':
+    if char in UNICODESET_SPECIAL_CHARS:
         return '\\' + char
     else:
         return char
 
-    
+
 def format_unicodeset(uset):
+    """icu.UnicodeSet --> readable pattern such as '[a-z ä {ch}]'
+
+    Walks the ranges and strings of the set in a single pass. Ranges
+    of fewer than four characters get spelled out. If the result does
+    not parse back to the same set, returns the set's own pattern.
+    """
+    items = []
+    append, escape = items.append, escape_for_unicodeset
+    it = icu.UnicodeSetIterator(uset)
+    while it.nextRange():
+        if it.isString():
+            append('{%s}' % ''.join(escape(c) for c in it.getString()))
+            continue
+        first, last = it.getCodepoint(), it.getCodepointEnd()
+        start, end = ord(first), ord(last)
+        if end - start >= 3:
+            append('%s-%s' % (escape(first), escape(last)))
+        else:
+            for c in range(start, end + 1):
+                append(escape(unichr(c)))
+    result = '[%s]' % ' '.join(items)
+    # Make sure we don't change semantics with our pretty-printing.
+    try:
+        if icu.UnicodeSet(result) == uset:
+            return result
+    except icu.ICUError:
+        pass
+    return uset.toPattern()
+
+
+_display_names = {}  # lang --> English name
+
+
+def get_display_name(lang):
+    if lang not in _display_names:
+        _display_names[lang] = icu.Locale(lang).getDisplayName()
+    return _display_names[lang]
+
+
+def format_ranges(uset):
+    """icu.UnicodeSet --> ['0430-044F', '0451', '{ch}']"""
     ranges = []
-    for i in range(uset.getRangeCount()):
-        if len(uset.getRangeStart(i)) != 1 or len(uset.getRangeEnd(i)) != 1:
-            return uset.toPattern()
-        start = ord(uset.getRangeStart(i))
-        end = ord(uset.getRangeEnd(i))
-        if end - start < 3:
-            ranges.extend([escape_for_unicodeset(unichr(c))
-                           for c in range(start, end + 1)])
+    it = icu.UnicodeSetIterator(uset)
+    while it.nextRange():
+        if it.isString():
+            ranges.append('{%s}' % it.getString())
         else:
-            ranges.append('%s-%s' %
-                          (escape_for_unicodeset(unichr(start)),
-                           escape_for_unicodeset(unichr(end))))
-    result = '[%s]' % ' '.join(ranges)
-    # Make sure we don't change semantics with our pretty-pretting.
-    if icu.UnicodeSet(result).toPattern() != uset.toPattern():
-        return uset.toPattern()
-    return result
+            start, end = ord(it.getCodepoint()), ord(it.getCodepointEnd())
+            if start == end:
+                ranges.append('%04X' % start)
+            else:
+                ranges.append('%04X-%04X' % (start, end))
+    return ranges
+
+
+def make_records(categories):
+    """[(status, {lang: (chars, refs, cldr_sources)})] --> records"""
+    for status, langs in categories:
+        for lang, (chars, refs, cldr_sources) in sorted(langs.items()):
+            yield {
+                'status': status,
+                'lang': lang,
+                'name': get_display_name(lang),
+                'chars': format_ranges(chars),
+                'references': refs,
+                'cldr_sources': sorted(cldr_sources),
+            }
+
+
+def diff_records(records, snapshot):
+    """Yields the records whose status or characters are not in snapshot.
+
+    The snapshot maps languages to records of an earlier run; languages
+    that have disappeared since then get reported with status 'removed'.
+    """
+    seen = set()
+    for record in records:
+        seen.add(record['lang'])
+        old = snapshot.get(record['lang'])
+        if (old is None or old['status'] != record['status'] or
+                old['chars'] != record['chars']):
+            yield record
+    for lang, old in sorted(snapshot.items()):
+        if lang not in seen:
+            yield dict(old, status='removed', chars=[])
+
+
+TSV_COLUMNS = ('status', 'lang', 'name', 'chars', 'references',
+               'cldr_sources')
+
+
+def write_tsv_record(record, out):
+    out.write('\t'.join(
+        ' '.join(value) if isinstance(value, list) else value
+        for value in (record[c] for c in TSV_COLUMNS)) + '\n')
+
+
+def write_jsonl_record(record, out):
+    out.write(json.dumps(record, ensure_ascii=False, sort_keys=True) + '\n')
 
 
 def write_additions(deltas, out):
     for lang, (chars, refs, cldr_sources) in sorted(deltas.items()):
         locale = icu.Locale(lang)
-        out.write('\n\n### %s: %s\n\n' % (lang, locale.getDisplayName()))
+        out.write('\n\n### %s: %s\n\n' % (lang, get_display_name(lang)))
         reflist = ['R%d' % i for i in range(1, len(refs) + 1)]
         references = ' references="%s"' % ' '.join(reflist) if reflist else ''
         if locale.getScript() in ('Arab', 'Thaa', 'Nkoo', 'Syrc'):
@@ -312,8 +572,7 @@ def write_additions(deltas, out):
 
 def write_deltas(deltas, out):
     for lang, (chars, refs, cldr_sources) in sorted(deltas.items()):
-        locale = icu.Locale(lang)
-        out.write('\n\n### %s: %s\n\n' % (lang, locale.getDisplayName()))
+        out.write('\n\n### %s: %s\n\n' % (lang, get_display_name(lang)))
         out.write('```\n%s\n```\n\n' % (format_unicodeset(chars)))
         if cldr_sources:
             markdown = '[%s](http://www.unicode.org/repos/cldr/trunk/%s)'
@@ -324,12 +583,24 @@ def write_deltas(deltas, out):
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Finds exemplar characters missing from CLDR.')
+    parser.add_argument('--jsonl', metavar='FILE',
+                        help='also write the findings as JSON lines')
+    parser.add_argument('--tsv', metavar='FILE',
+                        help='also write the findings as tab-separated values')
+    parser.add_argument('--snapshot', metavar='FILE',
+                        help='only write findings that differ from this '
+                        'snapshot of the previous run, then update it')
+    args = parser.parse_args()
     empty_uset = icu.UnicodeSet()
     fully_missing, fully_missing_manual_cleanup_needed = {}, {}
     chars_missing, ok, bogus = {}, {}, {}
     likely_subtags = read_likely_subtags()
     language_aliases = read_language_aliases()
     cldr_exemplars = read_cldr_exemplars()
+    resolver = LocaleResolver(
+        cldr_exemplars, read_parent_locales(), likely_subtags)
     fontconfig_exemplars = read_fontconfig_exemplars()
     for fclang, (fcset, fcrefs) in sorted(fontconfig_exemplars.items()):
         lang = language_aliases.get(fclang, fclang)
@@ -340,7 +611,7 @@ if __name__ == '__main__':
         if lang not in cldr_exemplars and not lang.startswith('zh_'):
             pattern = fcset.toPattern()
             lang = '_'.join((lang.split('_')[0], guess_script(pattern)))
-        cldrset, cldr_sources = get_cldr_exemplars(lang, cldr_exemplars)
+        cldrset, cldr_sources = resolver.get_exemplars(lang)
         if cldrset:
             if cldrset.containsAll(fcset):
                 ok[lang] = True
@@ -439,4 +710,43 @@ if __name__ == '__main__':
         'are also present in CLDR. No action needed.\n\n' %
         len(ok))
     for lang in sorted(ok):
-        out.write('* `%s` %s\n' % (lang, icu.Locale(lang).getDisplayName()))
+        out.write('* `%s` %s\n' % (lang, get_display_name(lang)))
+    out.close()
+
+    categories = [
+        ('missing', fully_missing),
+        ('manual-cleanup', fully_missing_manual_cleanup_needed),
+        ('chars-missing', chars_missing),
+        ('unsupported', bogus),
+        ('ok', {lang: (empty_uset, [], set()) for lang in ok}),
+    ]
+    records = make_records(categories)
+    snapshot = {}
+    if args.snapshot and os.path.exists(args.snapshot):
+        with codecs.open(args.snapshot, 'r', 'utf-8') as f:
+            old_snapshot = json.load(f)
+        records = diff_records(records, old_snapshot)
+        snapshot.update(old_snapshot)
+    writers = []
+    if args.jsonl:
+        jsonl_out = codecs.open(args.jsonl, 'w', 'utf-8')
+        writers.append(lambda r: write_jsonl_record(r, jsonl_out))
+    if args.tsv:
+        tsv_out = codecs.open(args.tsv, 'w', 'utf-8')
+        tsv_out.write('\t'.join(TSV_COLUMNS) + '\n')
+        writers.append(lambda r: write_tsv_record(r, tsv_out))
+    for record in records:
+        if record['status'] == 'removed':
+            snapshot.pop(record['lang'], None)
+        else:
+            snapshot[record['lang']] = record
+        for write in writers:
+            write(record)
+    if args.jsonl:
+        jsonl_out.close()
+    if args.tsv:
+        tsv_out.close()
+    if args.snapshot:
+        with codecs.open(args.snapshot, 'w', 'utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=1,
+                      sort_keys=True)
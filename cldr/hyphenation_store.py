@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+# A compact, memory-mapped store of hyphenation points, written by
+# convert_terms_de.py --store.
+#
+#     >>> store = HyphenationStore('terms-de.hyph')
+#     >>> store.breaks('Blutzucker', 'de')
+#     [4, 6]
+#     >>> store.hyphenate('Blutzucker', 'de')
+#     'Blut-zu-cker'
+#
+# Break positions count the characters of the term before the break.
+# Only good breaks (black dots in CLDR) get stored, not the white ones.
+# Where the spelling changes at a break, such as 'Zuk-ker' for 'Zucker'
+# in de-1901, the break gets stored at the same place in the term,
+# 'Zuc-ker'. Terms that occur more than once in a variant, with
+# different hyphenations, only keep the breaks that all of them share.
+#
+# File layout, with little-endian integers:
+#
+#   header  'HYPH', u8 version, u8 block size, u32 number of entries,
+#           u32 number of blocks, u32 offset of the block index, and the
+#           names of the variants in ASCII, each terminated by '\0',
+#           followed by an empty name
+#   blocks  entries sorted by the UTF-8 bytes of their term; the first
+#           term of each block is stored in full, the others share a
+#           prefix with the previous term
+#   index   u32 offset of each block
+#
+# An entry is: varint length of the prefix shared with the previous term,
+# varint length of the rest, the rest, then a flags byte. Bit i of the
+# flags tells whether the term exists in variant i; bit 4 + i that its
+# breaks are the same as in the previous existing variant. For each
+# existing variant that is not the same, the breaks follow as a varint
+# bitmask where bit n is set if the term can be hyphenated at position n.
+
+from __future__ import unicode_literals
+import mmap
+import os
+import struct
+
+MAGIC = b'HYPH'
+VERSION = 1
+BLOCK_SIZE = 16
+HEADER = struct.Struct(b'<4sBBIII')
+OFFSET = struct.Struct(b'<I')
+
+_ord = ord if bytes is str else int  # indexing bytes gives str in Python 2
+
+
+def _encode_varint(value):
+    result = bytearray()
+    while value >= 0x80:
+        result.append((value & 0x7f) | 0x80)
+        value >>= 7
+    result.append(value)
+    return bytes(result)
+
+
+def _decode_varint(data, pos):
+    result = shift = 0
+    while True:
+        b = _ord(data[pos])
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def positions_to_mask(positions):
+    mask = 0
+    for pos in positions:
+        mask |= 1 << pos
+    return mask
+
+
+def mask_to_positions(mask):
+    positions, pos = [], 0
+    while mask:
+        if mask & 1:
+            positions.append(pos)
+        mask >>= 1
+        pos += 1
+    return positions
+
+
+def _encode_entry(previous, key, masks):
+    shared = 0
+    limit = min(len(previous), len(key))
+    while shared < limit and previous[shared] == key[shared]:
+        shared += 1
+    flags, payload, last = 0, [], None
+    for i, mask in enumerate(masks):
+        if mask is None:
+            continue
+        flags |= 1 << i
+        if mask == last:
+            flags |= 1 << (4 + i)
+        else:
+            payload.append(_encode_varint(mask))
+        last = mask
+    return b''.join([_encode_varint(shared),
+                     _encode_varint(len(key) - shared), key[shared:],
+                     struct.pack(b'B', flags)] + payload)
+
+
+def write_store(path, variants, terms):
+    """Writes {term: [breaks mask or None for each variant]} to path."""
+    assert len(variants) <= 4
+    entries = sorted((term.encode('utf-8'), masks)
+                     for term, masks in terms.items())
+    names = b''.join(v.encode('ascii') + b'\0' for v in variants) + b'\0'
+    pos = HEADER.size + len(names)
+    blocks, offsets = [], []
+    for start in range(0, len(entries), BLOCK_SIZE):
+        previous, block = b'', []
+        for key, masks in entries[start:start + BLOCK_SIZE]:
+            block.append(_encode_entry(previous, key, masks))
+            previous = key
+        block = b''.join(block)
+        offsets.append(pos)
+        blocks.append(block)
+        pos += len(block)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, BLOCK_SIZE, len(entries),
+                              len(blocks), pos))
+        out.write(names)
+        for block in blocks:
+            out.write(block)
+        for offset in offsets:
+            out.write(OFFSET.pack(offset))
+    os.rename(tmp_path, path)
+
+
+class HyphenationStore(object):
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.num_entries, self._num_blocks, \
+            self._index = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s: not a hyphenation store' % path)
+        self.variants, pos = [], HEADER.size
+        while True:
+            end = self._data.find(b'\0', pos)
+            if end == pos:
+                break
+            self.variants.append(self._data[pos:end].decode('ascii'))
+            pos = end + 1
+
+    def close(self):
+        self._data.close()
+
+    def lookup(self, term):
+        """{variant: [break positions]} for term, or None if unknown."""
+        masks = self._find(term.encode('utf-8'))
+        if masks is None:
+            return None
+        return {variant: mask_to_positions(mask)
+                for variant, mask in zip(self.variants, masks)
+                if mask is not None}
+
+    def breaks(self, term, variant):
+        """[break positions] for term in variant, or None if unknown."""
+        masks = self._find(term.encode('utf-8'))
+        if masks is None:
+            return None
+        mask = masks[self.variants.index(variant)]
+        return mask_to_positions(mask) if mask is not None else None
+
+    def hyphenate(self, term, variant, hyphen='-'):
+        """'Blutzucker' --> 'Blut-zu-cker', or None if unknown."""
+        positions = self.breaks(term, variant)
+        if positions is None:
+            return None
+        parts, start = [], 0
+        for pos in positions:
+            parts.append(term[start:pos])
+            start = pos
+        parts.append(term[start:])
+        return hyphen.join(parts)
+
+    def _block_offset(self, block):
+        return OFFSET.unpack_from(self._data, self._index + 4 * block)[0]
+
+    def _first_key(self, block):
+        pos = self._block_offset(block)
+        _, pos = _decode_varint(self._data, pos)  # shared, always 0
+        length, pos = _decode_varint(self._data, pos)
+        return self._data[pos:pos + length]
+
+    # Returns the masks for key, after a binary search for its block and
+    # a scan through the block. While scanning, we only keep track of how
+    # many bytes the current term has in common with key, so the terms of
+    # the block never need to be put together.
+    def _find(self, key):
+        lo, hi = 0, self._num_blocks
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._first_key(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        block = lo - 1
+        data, pos = self._data, self._block_offset(block)
+        end = (self._block_offset(block + 1)
+               if block + 1 < self._num_blocks else self._index)
+        matched = 0
+        while pos < end:
+            shared, pos = _decode_varint(data, pos)
+            length, pos = _decode_varint(data, pos)
+            suffix, pos = pos, pos + length
+            if shared < matched:
+                return None  # the term sorts after key
+            if shared == matched:
+                n = 0
+                while (n < length and matched + n < len(key) and
+                       _ord(data[suffix + n]) == _ord(key[matched + n])):
+                    n += 1
+                if n == length and matched + n == len(key):
+                    return self._read_masks(pos)
+                if n < length and (matched + n == len(key) or
+                                   _ord(data[suffix + n]) >
+                                   _ord(key[matched + n])):
+                    return None
+                matched += n
+            pos = self._skip_masks(pos)
+        return None
+
+    def _read_masks(self, pos):
+        flags = _ord(self._data[pos])
+        pos += 1
+        masks, last = [], None
+        for i in range(len(self.variants)):
+            if not flags & (1 << i):
+                masks.append(None)
+                continue
+            if not flags & (1 << (4 + i)):
+                last, pos = _decode_varint(self._data, pos)
+            masks.append(last)
+        return masks
+
+    def _skip_masks(self, pos):
+        flags = _ord(self._data[pos])
+        pos += 1
+        for i in range(len(self.variants)):
+            if flags & (1 << i) and not flags & (1 << (4 + i)):
+                while _ord(self._data[pos]) >= 0x80:
+                    pos += 1
+                pos += 1
+        return pos
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Looks up terms in a hyphenation store.')
+    parser.add_argument('store', help='path to a store, such as terms-de.hyph')
+    parser.add_argument('terms', nargs='+', help='terms to look up')
+    args = parser.parse_args()
+    store = HyphenationStore(args.store)
+    for term in args.terms:
+        term = term.decode('utf-8') if isinstance(term, bytes) else term
+        for variant in store.variants:
+            hyphenated = store.hyphenate(term, variant)
+            if hyphenated is not None:
+                print(('%s\t%s' % (variant, hyphenated)).encode('utf-8'))
@@ -1,11 +1,33 @@
 # -*- coding: utf-8 -*-
 
+# Exports our transliteration rules and tests to a checkout of CLDR.
+#
+# Every rules/xx.txt file becomes a CLDR transform, and its test/xx.txt
+# file (if any) a transformtest data file. Outputs whose inputs have not
+# changed since the last export are skipped.
+#
+#     $ python prepare_for_cldr.py --cldr ~/src/cldr          # everything
+#     $ python prepare_for_cldr.py --cldr ~/src/cldr am ta_LK
+
 from __future__ import unicode_literals
+import argparse
 import codecs
+import functools
+import hashlib
+import multiprocessing
+import os
 import sys
 import unicodedata
+from xml.sax.saxutils import escape
+
+import cldr_util
 
 CLDR_PATH = "/home/sascha/src/cldr"
+SCRIPT_PATH = os.path.abspath(__file__)
+
+TRANSFORMS_DIR = "common/transforms"
+TRANSFORMTEST_DIR = ("tools/cldr-unittest/src/"
+                     "org/unicode/cldr/unittest/data/transformtest")
 
 HEADER = """<?xml version="1.0" encoding="UTF-8" ?>
 <!DOCTYPE supplementalData SYSTEM "../../common/dtd/ldmlSupplemental.dtd">
@@ -25,27 +47,107 @@ FOOTER = """		</transform>
 """
 
 
-def PrepareForCLDR(lang):
-    target = "%s_FONIPA" % lang
-    path = "%s-%s.txt" % (lang, target)
-    out = codecs.open(CLDR_PATH + "/common/transforms/%s-%s.xml" %
-                      (lang, target), "w", "utf-8")
-    out.write(HEADER % (lang, target))
-    for line in codecs.open(path, "r", "utf-8"):
-        line = unicodedata.normalize("NFC", line).strip()
-        if not line or line[0] != '#':
-            out.write(u"\t\t\t<tRule>%s</tRule>\n" % line)
-        else:
-            out.write(u"\t\t\t<comment>%s</comment>\n" % line)
+# 'ta-LK-fonipa' --> 'ta_LK_FONIPA'
+def get_cldr_name(tag):
+    return '_'.join(subtag.upper() if len(subtag) >= 5 else subtag
+                    for subtag in tag.split('-'))
+
+
+# 'am-fonipa-t-am' --> ('am', 'am_FONIPA')
+def get_source_and_target(translit_name):
+    target, source = translit_name.split('-t-')
+    return get_cldr_name(source), get_cldr_name(target)
+
+
+def write_transform(translit_name, out):
+    source, target = get_source_and_target(translit_name)
+    out.write(HEADER % (source, target))
+    with codecs.open('rules/%s.txt' % translit_name, 'r', 'utf-8') as f:
+        for line in f:
+            line = escape(unicodedata.normalize('NFC', line).strip())
+            if not line or line[0] != '#':
+                out.write('\t\t\t<tRule>%s</tRule>\n' % line)
+            else:
+                out.write('\t\t\t<comment>%s</comment>\n' % line)
     out.write(FOOTER)
-    out.close()
 
-    with codecs.open("test-%s-%s.txt" % (lang, target), "r", "utf-8") as test_in:
-        with codecs.open(
-            CLDR_PATH + "/tools/cldr-unittest/src/" +
-            "org/unicode/cldr/unittest/data/transformtest/%s-%s.txt" %
-            (lang, target), "w", "utf-8") as test_out:
-            test_out.write(unicodedata.normalize("NFC", test_in.read()))
+
+def write_transformtest(translit_name, out):
+    with codecs.open('test/%s.txt' % translit_name, 'r', 'utf-8') as f:
+        for line in f:
+            out.write(unicodedata.normalize('NFC', line))
+
+
+# Returns [(output path, input paths, writer)] for one rules file.
+def find_outputs(translit_name, cldr_path):
+    source, target = get_source_and_target(translit_name)
+    filename = '%s-%s' % (source, target)
+    outputs = [(os.path.join(cldr_path, TRANSFORMS_DIR, filename + '.xml'),
+                ['rules/%s.txt' % translit_name], write_transform)]
+    if os.path.exists('test/%s.txt' % translit_name):
+        outputs.append(
+            (os.path.join(cldr_path, TRANSFORMTEST_DIR, filename + '.txt'),
+             ['test/%s.txt' % translit_name], write_transformtest))
+    return outputs
+
+
+# An output needs to be re-written if its inputs or this script change.
+def fingerprint(input_paths):
+    digest = hashlib.sha1()
+    for path in input_paths + [SCRIPT_PATH]:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def export(translit_name, cldr_path, stamps):
+    written = []
+    for path, input_paths, writer in find_outputs(translit_name, cldr_path):
+        stamp = fingerprint(input_paths)
+        if stamps.get(path) == stamp and os.path.exists(path):
+            continue
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with codecs.open(tmp_path, 'w', 'utf-8') as out:
+            writer(translit_name, out)
+        os.rename(tmp_path, path)
+        written.append((path, stamp))
+    return translit_name, written
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Exports the transliteration rules and tests to CLDR.')
+    parser.add_argument('languages', nargs='*',
+                        help='only export these, such as "am" or "ta_LK"')
+    parser.add_argument('--cldr', default=CLDR_PATH,
+                        help='path to a checkout of CLDR')
+    parser.add_argument('--force', action='store_true',
+                        help='also export rules that have not changed')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes')
+    args = parser.parse_args()
+    cldr_path = os.path.abspath(os.path.expanduser(args.cldr))
+    os.chdir(os.path.dirname(SCRIPT_PATH))
+
+    names = sorted(os.path.splitext(f)[0] for f in os.listdir('rules')
+                   if f.endswith('.txt'))
+    if args.languages:
+        names = [n for n in names
+                 if get_source_and_target(n)[0] in args.languages]
+    stamps = cldr_util.read_cache('prepare-for-cldr.json', {})
+    num_jobs = min(args.jobs or multiprocessing.cpu_count(), len(names))
+    pool = multiprocessing.Pool(max(num_jobs, 1))
+    run = functools.partial(export, cldr_path=cldr_path,
+                            stamps={} if args.force else stamps)
+    for translit_name, written in pool.imap_unordered(run, names):
+        for path, stamp in written:
+            stamps[path] = stamp
+        print('%s: %d files written' % (translit_name, len(written)))
+    pool.close()
+    pool.join()
+    cldr_util.write_cache('prepare-for-cldr.json', stamps)
+    return 0
 
 
-PrepareForCLDR('am')
+if __name__ == '__main__':
+    sys.exit(main())
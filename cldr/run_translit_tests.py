@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+# Runs all transliteration regression tests in one go.
+#
+# Every rules/xx.txt file with a matching test/xx.txt file is a suite.
+# The grapheme and phoneme inventories come from inventories/xx.txt.
+# Suites get run in parallel, one worker process per CPU, and suites
+# whose inputs have not changed since their last green run are skipped.
+#
+#     $ python run_translit_tests.py           # all suites
+#     $ python run_translit_tests.py fa my     # only Persian and Burmese
+#     $ python run_translit_tests.py --force   # also unchanged suites
+#     $ python run_translit_tests.py --watch   # re-test after every edit
+#     $ python run_translit_tests.py --coverage sat  # hot and dead rules
+
+from __future__ import unicode_literals
+import argparse
+import functools
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+
+import cldr_util
+
+def find_suites():
+    suites = []
+    for filename in sorted(os.listdir('rules')):
+        name, ext = os.path.splitext(filename)
+        if ext == '.txt' and os.path.exists('test/%s.txt' % name):
+            suites.append(name)
+    return suites
+
+
+# 'ta-LK-fonipa-t-ta-LK' --> 'ta_LK'
+def get_language(translit_name):
+    return translit_name.split('-t-')[-1].replace('-', '_')
+
+
+def get_inventory(translit_name):
+    return cldr_util.get_inventory(get_language(translit_name))
+
+
+# A suite needs to be re-run if any of its inputs has changed,
+# including the checking code itself.
+def fingerprint(translit_name):
+    digest = hashlib.sha1()
+    for path in ('rules/%s.txt' % translit_name,
+                 'test/%s.txt' % translit_name,
+                 'inventories/%s.txt' % get_language(translit_name),
+                 'cldr_util.py'):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+# With indexes, a dict from suite name to RuleIndex, rule indexes get
+# reused and incrementally updated across runs.
+def run_suite(translit_name, batch_size=None, indexes=None):
+    errors = []
+    try:
+        graphemes, phonemes = get_inventory(translit_name)
+        index = None
+        if indexes is not None:
+            index = indexes.get(translit_name)
+            if index is None:
+                index = indexes[translit_name] = cldr_util.RuleIndex(
+                    'rules/%s.txt' % translit_name)
+            else:
+                index.update()
+        for error in cldr_util.check_errors(
+                translit_name, graphemes, phonemes, index=index):
+            errors.append(error)
+        for error in cldr_util.regtest_errors(
+                translit_name, graphemes, phonemes, batch_size=batch_size):
+            errors.append(error)
+    except Exception as e:
+        errors.append('%s: %s: %s' % (translit_name, type(e).__name__, e))
+    return translit_name, errors
+
+
+# How often --watch looks for changed files, in seconds.
+WATCH_INTERVAL = 0.2
+
+
+def print_diff(translit_name, previous, errors):
+    previous_set, errors_set = set(previous), set(errors)
+    for error in previous:
+        if error not in errors_set:
+            print(('- %s' % error).encode('utf-8'))
+    for error in errors:
+        if error not in previous_set:
+            print(('+ %s' % error).encode('utf-8'))
+    print('%s: %d errors, %+d since last run' %
+          (translit_name, len(errors), len(errors) - len(previous)))
+
+
+# Keeps compiled transliterators, rule indexes and test cases in memory,
+# and re-runs a suite whenever its rules or tests change. Changes to the
+# inventories need a restart.
+def watch(suites, batch_size=None):
+    indexes, stamps, previous = {}, {}, {}
+    while True:
+        for s in suites:
+            try:
+                stamp = (os.stat('rules/%s.txt' % s).st_mtime,
+                         os.stat('test/%s.txt' % s).st_mtime)
+            except OSError:  # editors may briefly remove the file on save
+                continue
+            if stamps.get(s) == stamp:
+                continue
+            stamps[s] = stamp
+            _, errors = run_suite(s, batch_size=batch_size, indexes=indexes)
+            print_diff(s, previous.get(s, []), errors)
+            previous[s] = errors
+        time.sleep(WATCH_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Runs the transliteration regression tests.')
+    parser.add_argument('languages', nargs='*',
+                        help='only run these suites, such as "am" or "ta_LK"')
+    parser.add_argument('--force', action='store_true',
+                        help='also run suites that have not changed')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='check test inputs against the inventories in batches')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running, re-test suites after each change')
+    parser.add_argument('--coverage', action='store_true',
+                        help='report how often each rule matters, '
+                        'and which rules are dead')
+    args = parser.parse_args()
+
+    suites = find_suites()
+    if args.languages:
+        suites = [s for s in suites if get_language(s) in args.languages]
+    if args.watch:
+        try:
+            watch(suites, batch_size=args.batch_size)
+        except KeyboardInterrupt:
+            return 0
+
+    green = cldr_util.read_cache('green-suites.json', {})
+    fingerprints = {s: fingerprint(s) for s in suites}
+    todo = [s for s in suites
+            if args.force or green.get(s) != fingerprints[s]]
+    for s in suites:
+        if s not in todo:
+            print('%s: unchanged since last green run, skipped' % s)
+
+    num_failed = 0
+    if todo:
+        num_jobs = args.jobs or multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(min(num_jobs, len(todo)))
+        run = functools.partial(run_suite, batch_size=args.batch_size)
+        for translit_name, errors in pool.imap_unordered(run, todo):
+            for error in errors:
+                print(error.encode('utf-8'))
+            if errors:
+                num_failed += 1
+                green.pop(translit_name, None)
+                print('%s: FAIL, %d errors' % (translit_name, len(errors)))
+            else:
+                green[translit_name] = fingerprints[translit_name]
+                print('%s: OK' % translit_name)
+        pool.close()
+        pool.join()
+        cldr_util.write_cache('green-suites.json', green)
+    if args.coverage:
+        for s in suites:
+            cldr_util.report(cldr_util.coverage_errors(s, jobs=args.jobs))
+    return 1 if num_failed else 0
+
+
+if __name__ == '__main__':
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+# Downloads files over HTTP and keeps them in a local cache.
+#
+#     import fetch_cache
+#     content = fetch_cache.fetch(url)          # bytes
+#     with fetch_cache.open_url(url) as f:      # binary file object
+#         for line in f: ...
+#
+# Scripts in unilex/, pronunciation/ and cldr/bcp47_opentype/ import this
+# module through a symlink in their own directory, so they can still be
+# run from there.
+#
+# Cached files get revalidated with the server once they are older
+# than max_age seconds, using ETag and Last-Modified, so unchanged files
+# are not downloaded again. Bodies are stored under the SHA-256 of their
+# content, optionally gzipped; all writes are atomic.
+#
+# Environment variables:
+#   FETCH_CACHE_DIR      where to keep the cache; default: a directory
+#                        in the system's temp directory
+#   FETCH_CACHE_OFFLINE  a directory of fixtures; if set, we never touch
+#                        the network. A URL is looked up in the fixture
+#                        directory, under its quote_plus() encoded name,
+#                        and then in the cache.
+
+from __future__ import unicode_literals
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+
+try:  # Python 3
+    from urllib.error import HTTPError
+    from urllib.parse import quote_plus
+    from urllib.request import Request, urlopen
+except ImportError:  # Python 2
+    from urllib import quote_plus
+    from urllib2 import HTTPError, Request, urlopen
+
+CACHE_DIR = os.environ.get('FETCH_CACHE_DIR') or os.path.join(
+    tempfile.gettempdir(), 'fetch-cache')
+
+# By default, files get revalidated once per day.
+DEFAULT_MAX_AGE = 24 * 3600
+
+
+class FetchError(Exception):
+    pass
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_atomically(path, data):
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:  # created by another process in the meantime
+            pass
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as out:
+        out.write(data)
+    os.rename(tmp_path, path)
+
+
+def _entry_path(url):
+    return os.path.join(CACHE_DIR, 'urls',
+                        _sha256(url.encode('utf-8')) + '.json')
+
+
+def _object_path(digest, compressed):
+    return os.path.join(CACHE_DIR, 'objects', digest[:2],
+                        digest + ('.gz' if compressed else ''))
+
+
+def _read_entry(url):
+    path = _entry_path(url)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        entry = json.loads(f.read().decode('utf-8'))
+    if not os.path.exists(_object_path(entry['sha256'], entry['gzip'])):
+        return None
+    return entry
+
+
+def _write_entry(url, entry):
+    data = json.dumps(entry, sort_keys=True).encode('utf-8')
+    _write_atomically(_entry_path(url), data)
+
+
+def _store(content, compress):
+    digest = _sha256(content)
+    path = _object_path(digest, compress)
+    if not os.path.exists(path):
+        if compress:
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as z:
+                z.write(content)
+            _write_atomically(path, buf.getvalue())
+        else:
+            _write_atomically(path, content)
+    return digest
+
+
+def _download(url, entry):
+    request = Request(url)
+    request.add_header('Accept-Encoding', 'gzip')
+    if entry is not None:
+        if entry.get('etag'):
+            request.add_header('If-None-Match', entry['etag'])
+        if entry.get('last_modified'):
+            request.add_header('If-Modified-Since', entry['last_modified'])
+    try:
+        response = urlopen(request)
+    except HTTPError as e:
+        if e.code == 304 and entry is not None:
+            return None, e.headers
+        raise FetchError('%s: HTTP status %d' % (url, e.code))
+    try:
+        content = response.read()
+        headers = response.info()
+    finally:
+        response.close()
+    if headers.get('Content-Encoding') == 'gzip':
+        content = gzip.GzipFile(fileobj=io.BytesIO(content)).read()
+    return content, headers
+
+
+def _fixture_path(url):
+    fixtures = os.environ.get('FETCH_CACHE_OFFLINE')
+    if not fixtures:
+        return None
+    return os.path.join(fixtures, quote_plus(url.encode('utf-8')))
+
+
+def fetch_to_cache(url, max_age=DEFAULT_MAX_AGE, compress=False, delay=0):
+    """Makes sure url is in the cache. Returns (path, is_gzipped).
+
+    max_age: seconds after which to revalidate, or None for never
+    delay: seconds to wait before talking to the server, to be polite
+    """
+    fixture = _fixture_path(url)
+    if fixture is not None and os.path.exists(fixture):
+        return fixture, False
+    entry = _read_entry(url)
+    if entry is not None and (
+            fixture is not None or max_age is None or
+            time.time() - entry['checked'] < max_age):
+        return _object_path(entry['sha256'], entry['gzip']), entry['gzip']
+    if fixture is not None:
+        raise FetchError('%s: not available offline' % url)
+    if delay:
+        time.sleep(delay)
+    content, headers = _download(url, entry)
+    if content is None:  # not modified
+        entry['checked'] = time.time()
+    else:
+        entry = {
+            'url': url,
+            'sha256': _store(content, compress),
+            'gzip': compress,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'checked': time.time(),
+        }
+    _write_entry(url, entry)
+    return _object_path(entry['sha256'], entry['gzip']), entry['gzip']
+
+
+def open_url(url, **kwargs):
+    """Returns a binary file object for the content at url."""
+    path, compressed = fetch_to_cache(url, **kwargs)
+    return gzip.open(path, 'rb') if compressed else open(path, 'rb')
+
+
+def fetch(url, **kwargs):
+    """Returns the content at url as bytes."""
+    with open_url(url, **kwargs) as f:
+        return f.read()
@@ -1,7 +1,9 @@
 #!/usr/bin/python2.7
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
-import codecs, os, urllib
+import codecs
+
+import fetch_cache
 
 
 """Removes diacritics from a Persian corpus. Output is tab-separated UTF-8."""
@@ -15,18 +17,16 @@ def unaccent(word):
     return word
 
 
+CORPUS_URL = ('https://github.com/googlei18n/language-resources/raw/master/'
+              'third_party/fa/updt/updt-with-diacritics.txt')
+
+
 def load_corpus():
-    path = '/tmp/updt-with-diacritics.txt'
-    if not os.path.exists(path):
-        url = ('https://github.com/googlei18n/language-resources/raw/master/'
-               'third_party/fa/updt/updt-with-diacritics.txt')
-        with open(path, 'w') as out:
-            out.write(urllib.urlopen(url).read())
-    return path
+    return codecs.getreader('utf-8')(fetch_cache.open_url(CORPUS_URL))
 
 
-def unaccent_corpus(path):
-    for line in codecs.open(path, 'r', 'utf-8'):
+def unaccent_corpus(lines):
+    for line in lines:
         for c in ' ؛.,!?[+/];»:»()“‘" ؟؉؊؍،–—': line = line.replace(c, ' ')
         words = line.split()
         for word in words:
@@ -1,24 +1,20 @@
 # coding: utf-8
 
 from __future__ import print_function, unicode_literals
-import codecs, collections, icu, os, re, unicodedata, urllib
+import codecs, collections, icu, re, unicodedata
+
+import fetch_cache
 
 # TODO: Change to googlei18n/language-resources after this pull request
 # got merged: https://github.com/googlei18n/language-resources/pull/11
 UPSTREAM_URL = ('https://raw.githubusercontent.com/brawer/'
                 'language-resources/master/bn/')
-CACHE_DIR = '/tmp/cache-lexicon-bn'
 LOCALE = icu.Locale('bn')
 COLLATOR = icu.Collator.createInstance(LOCALE)
 
 
 def open_upstream_file(filename):
-    cache = os.path.join(CACHE_DIR, filename.replace('/', '-'))
-    if not os.path.exists(cache):
-        content = urllib.urlopen(UPSTREAM_URL + filename).read()
-        with open(cache, 'wb') as out:
-            out.write(content)
-    return open(cache, 'rb')
+    return fetch_cache.open_url(UPSTREAM_URL + filename)
 
 
 # http://universaldependencies.org/u/pos/
@@ -96,8 +92,6 @@ def ipa(t, phonemes):
 
 
 if __name__ == '__main__':
-    if not os.path.exists(CACHE_DIR):
-        os.mkdir(CACHE_DIR)
     phonemes = read_phonemes()
     lex = [(word, pos, feat, ipa(s, phonemes)) for word, pos, feat, s in read_lexicon()]
     lex.sort(cmp=compare_entry)
@@ -1,24 +1,20 @@
 # coding: utf-8
 
 from __future__ import print_function, unicode_literals
-import codecs, icu, os, re, unicodedata, urllib
+import codecs, icu, re, unicodedata
 import xml.etree.ElementTree as etree
 
+import fetch_cache
+
 
 LEXICON_URL = ('https://raw.githubusercontent.com/marytts/marytts-lexicon-fr/'
                'master/modules/fr/lexicon/')
-CACHE_DIR = '/tmp/cache-lexicon-fr'
 LOCALE = icu.Locale('fr')
 COLLATOR = icu.Collator.createInstance(LOCALE)
 
 
 def open_lexicon_file(filename):
-    cache = os.path.join(CACHE_DIR, filename)
-    if not os.path.exists(cache):
-        content = urllib.urlopen(LEXICON_URL + filename).read()
-        with open(cache, 'w') as out:
-            out.write(content)
-    return open(cache, 'rb')
+    return fetch_cache.open_url(LEXICON_URL + filename)
 
 
 def read_lexicon():
@@ -64,8 +60,6 @@ def compare_entry(a, b):
 
 
 if __name__ == '__main__':
-    if not os.path.exists(CACHE_DIR):
-        os.mkdir(CACHE_DIR)
     allophones = read_allophones()
     ipa_regexp = _build_ipa_regexp(allophones)
     def ipa(sampa):
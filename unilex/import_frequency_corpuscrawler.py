@@ -1,7 +1,9 @@
 # coding: utf-8
 
 from __future__ import print_function, unicode_literals
-import codecs, icu, os, re, shutil, time, unicodedata, urllib
+import codecs, icu, os, re, shutil, unicodedata
+
+import fetch_cache
 
 
 CACHE_DIR = '/tmp/unilex-import-frequency'
@@ -42,14 +44,7 @@ def get_available_languages():
 
 
 def get_frequencies(lang, url):
-    local_path = os.path.join(CACHE_DIR, '%s.txt' % lang)
-    if not os.path.exists(local_path):
-        time.sleep(1.0)
-        content = urllib.urlopen(url).read()
-        with open(local_path, 'w') as out:
-            out.write(content)
-    with open(local_path, 'r') as freqfile:
-        content = freqfile.read().decode('utf-8')
+    content = fetch_cache.fetch(url, delay=1.0).decode('utf-8')
     forms = []
     corpus_size = 0
     for line in content.splitlines():
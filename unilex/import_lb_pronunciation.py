@@ -1,25 +1,22 @@
 # coding: utf-8
 from __future__ import print_function, unicode_literals
-import codecs, icu, os, re, unicodedata, urllib
+import icu, re, unicodedata
 import xml.etree.ElementTree as etree
 
+import fetch_cache
+
 
 LEXICON_URL = ('https://raw.githubusercontent.com/marytts/marytts-lexicon-lb/'
                'master/modules/lb/lexicon/')
 WORDCOUNT_URL = 'http://www.gstatic.com/i18n/corpora/wordcounts/lb.txt'
-CACHE_DIR = '/tmp/cache-lexicon-lb'
 LOCALE = icu.Locale('lb')
 COLLATOR = icu.Collator.createInstance(LOCALE)
 
 
 def get_allophones():
     mapping = {'ts': 't͡s', 'ts\\': 't͡ɕ', 'i6': 'iɐ̯', '3I': 'ɜɪ̯'}
-    cache = os.path.join(CACHE_DIR, 'allophones.xml')
-    if not os.path.exists(cache):
-        content = urllib.urlopen(LEXICON_URL + 'allophones.lb.xml').read()
-        with open(cache, 'w') as out:
-            out.write(content)
-    r = etree.parse(cache).getroot()
+    with fetch_cache.open_url(LEXICON_URL + 'allophones.lb.xml') as f:
+        r = etree.parse(f).getroot()
     for element in (r.findall('./vowel') + r.findall('./consonant')):
         if 'ph' in element.attrib and 'ipa' in element.attrib:
             mapping[element.attrib['ph']] = element.attrib['ipa']
@@ -28,12 +25,8 @@ def get_allophones():
 
 def get_wordcounts():
     counts = {}
-    cache = os.path.join(CACHE_DIR, 'wordcounts.txt')
-    if not os.path.exists(cache):
-        content = urllib.urlopen(WORDCOUNT_URL).read()
-        with open(cache, 'w') as out:
-            out.write(content)
-    for line in codecs.open(cache, 'r', 'utf-8'):
+    content = fetch_cache.fetch(WORDCOUNT_URL).decode('utf-8')
+    for line in content.splitlines():
         line = line.split('#')[0].strip()
         if not line:
             continue
@@ -55,12 +48,8 @@ def compare_lb(a, b):
 
 def read_lexicon():
     lex = []
-    cache = os.path.join(CACHE_DIR, 'lexicon.txt')
-    if not os.path.exists(cache):
-        content = urllib.urlopen(LEXICON_URL + 'lb.txt').read()
-        with open(cache, 'w') as out:
-            out.write(content)
-    for line in codecs.open(cache, 'r', 'utf-8'):
+    content = fetch_cache.fetch(LEXICON_URL + 'lb.txt').decode('utf-8')
+    for line in content.splitlines():
         line = line.split('#')[0].strip()
         if not line:
             continue
@@ -70,8 +59,6 @@ def read_lexicon():
 
 
 if __name__ == '__main__':
-    if not os.path.exists(CACHE_DIR):
-        os.mkdir(CACHE_DIR)
     allophones = get_allophones()
     wordcounts = get_wordcounts()
     r = '|'.join(sorted(allophones.keys(), key=lambda x:(-len(x), x)))
@@ -1,24 +1,20 @@
 # coding: utf-8
 
 from __future__ import print_function, unicode_literals
-import codecs, icu, os, re, unicodedata, urllib
+import codecs, icu, re, unicodedata
 import xml.etree.ElementTree as etree
 
+import fetch_cache
+
 
 LEXICON_URL = ('https://raw.githubusercontent.com/brawer/marytts-lexicon-pl/'
                'master/modules/pl/lexicon/')
-CACHE_DIR = '/tmp/cache-lexicon-pl'
 LOCALE = icu.Locale('pl')
 COLLATOR = icu.Collator.createInstance(LOCALE)
 
 
 def open_lexicon_file(filename):
-    cache = os.path.join(CACHE_DIR, filename)
-    if not os.path.exists(cache):
-        content = urllib.urlopen(LEXICON_URL + filename).read()
-        with open(cache, 'w') as out:
-            out.write(content)
-    return open(cache, 'rb')
+    return fetch_cache.open_url(LEXICON_URL + filename)
 
 
 def read_lexicon():
@@ -72,8 +68,6 @@ def ipa(pseudosampa, allophones):
 
 
 if __name__ == '__main__':
-    if not os.path.exists(CACHE_DIR):
-        os.mkdir(CACHE_DIR)
     allophones = read_allophones()
     lex = [(word, ipa(pseudosampa, allophones))
            for word, pseudosampa in read_lexicon()]
@@ -1,21 +1,18 @@
 # coding: utf-8
 from __future__ import print_function, unicode_literals
-import codecs, os, unicodedata, urllib
+import unicodedata
 import icu
 
+import fetch_cache
+
 URL = ('https://raw.githubusercontent.com/googlei18n/language-resources/'
        'master/si/data/lexicon.tsv')
 
-CACHED_PATH = '/tmp/lexicon-si.tsv'
-
 
 def read_lexicon():
     lex = []
-    if not os.path.exists(CACHED_PATH):
-        content = urllib.urlopen(URL).read()
-        with open(CACHED_PATH, 'w') as out:
-            out.write(content)
-    for line in codecs.open(CACHED_PATH, 'r', 'utf-8'):
+    content = fetch_cache.fetch(URL).decode('utf-8')
+    for line in content.splitlines():
         line = line.split('#')[0].strip()
         if not line:
             continue
@@ -1,17 +1,12 @@
 # coding: utf-8
 
 from __future__ import unicode_literals
-import codecs, collections, icu, re, unicodedata
+import codecs, collections, icu, os, re, sys, unicodedata
 
-
-PHONEMES = '''
-m n ɲ ŋ
-p b t d k ɡ
-f v ɾ s z h
-l ʎ j w
-t͡ʃ d͡ʒ d͡z
-i u e e̯ o ɛ ɔ a
-'''
+# The phoneme inventory is shared with the transliteration checks in ../cldr.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'cldr'))
+from cldr_util import get_inventory, match
 
 IPA_TRANSLIT_RULES = '''
 
@@ -116,23 +111,6 @@ def make_transliterator():
         'vec-vec_FONIPA', IPA_TRANSLIT_RULES, icu.UTransDirection.FORWARD)
 
 
-def make_phoneme_set(s):
-    pat = [u'\\u0020', "ˈ", '.']
-    for phoneme in s.split():
-        if len(phoneme) == 1:
-            pat.append(phoneme)
-        else:
-            pat.append('{%s}' % phoneme)
-    result = icu.UnicodeSet()
-    result.applyPattern('[%s]' % ' '.join(pat))
-    return result
-
-
-def match(s, unicodeset):
-    return icu.UnicodeSet.span(
-        unicodeset, s, icu.USetSpanCondition.SPAN_CONTAINED) == len(s)
-
-
 def _build_split_regexps():
     onsets = list('''
         j w
@@ -197,7 +175,7 @@ def compare_entry(a, b):
 def main():
     onsets = collections.Counter()
     translit = make_transliterator()
-    phonemes = make_phoneme_set(PHONEMES)
+    _, phonemes = get_inventory('vec')
     print('Form\tPronunciation\n')
     print('# SPDX-License-Identifier: Unicode-DFS-2016\n')
     entries = []